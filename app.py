@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import random
+import re
 import sqlite3
 import string
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
 
-from flask import Flask, render_template, request, redirect, session, url_for, flash
+import click
+from flask import Flask, Response, g, has_app_context, jsonify, render_template, request, redirect, session, url_for, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: migrations run unlocked.
+    fcntl = None
+
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
-DB_PATH = BASE_DIR / "codecourse.db"
+DB_PATH = Path(os.environ.get("CODECOURSE_DB", BASE_DIR / "codecourse.db"))
+MIGRATION_LOCK_PATH = DB_PATH.with_name(DB_PATH.name + ".migrate.lock")
 
 app = Flask(__name__)
 app.secret_key = "dev-key"
@@ -26,29 +39,189 @@ GMAIL_USER = os.environ.get("CODECOURSE_GMAIL_USER")
 GMAIL_APP_PASS = os.environ.get("CODECOURSE_GMAIL_PASS")
 
 
-@app.context_processor
-def inject_static_version():
-    """Cache-bust static assets when files change (helps on Render + browsers)."""
+_static_version: int | None = None
+
+
+def compute_static_version() -> int:
     try:
         css_path = BASE_DIR / "static" / "style.css"
-        static_version = int(css_path.stat().st_mtime)
+        return int(css_path.stat().st_mtime)
     except Exception:
-        static_version = int(time.time())
-    return {"static_version": static_version}
+        return int(time.time())
+
+
+@app.context_processor
+def inject_static_version():
+    """Cache-bust static assets when files change (helps on Render + browsers)."""
+    global _static_version
+    if _static_version is None or app.debug:
+        _static_version = compute_static_version()
+    return {"static_version": _static_version}
+
+
+# ---------------- Metrics ----------------
+
+_metrics_lock = threading.Lock()
+_metrics: dict[str, float] = {}
+
+
+def incr_metric(name: str, amount: float = 1):
+    with _metrics_lock:
+        _metrics[name] = _metrics.get(name, 0) + amount
+
+
+def set_metric(name: str, value: float):
+    with _metrics_lock:
+        _metrics[name] = value
+
+
+def observe_timing(name: str, seconds: float):
+    with _metrics_lock:
+        _metrics[f"{name}.count"] = _metrics.get(f"{name}.count", 0) + 1
+        _metrics[f"{name}.total_seconds"] = _metrics.get(f"{name}.total_seconds", 0) + seconds
+        _metrics[f"{name}.max_seconds"] = max(_metrics.get(f"{name}.max_seconds", 0), seconds)
+
+
+def metrics_snapshot() -> dict:
+    """Per-worker counters; each gunicorn worker keeps its own copy."""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    snapshot["pid"] = os.getpid()
+    return snapshot
 
 
 # ---------------- DB ----------------
 
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection whose close() hands it back to the pool; request connections go back at teardown."""
+
+    bound_to_request = False
+
+    def close(self):
+        if self.bound_to_request:
+            return
+        _pool.release(self)
+
+    def close_for_real(self):
+        super().close()
+
+
+class ConnectionPool:
+    """Keeps idle SQLite connections around for reuse within one process."""
+
+    def __init__(self, path: Path, max_idle: int = 8):
+        self.path = path
+        self.max_idle = max_idle
+        self.trace = None  # passed to set_trace_callback on every new connection
+        self._idle: list[PooledConnection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Connections must never cross a fork; a preloaded gunicorn master may
+        # have opened some before spawning this worker.
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.path,
+            factory=PooledConnection,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        if self.trace is not None:
+            conn.set_trace_callback(self.trace)
+        incr_metric("db.connections_opened")
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            self._check_fork()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._connect()
+        incr_metric("db.connections_reused")
+        return conn
+
+    def release(self, conn: PooledConnection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.max_idle and conn not in self._idle:
+                self._idle.append(conn)
+                return
+        conn.close_for_real()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close_for_real()
+
+
+_pool = ConnectionPool(DB_PATH)
+
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Return the request's connection, or a pooled one outside a request."""
+    if not has_app_context():
+        return _pool.acquire()
+    conn = g.get("db")
+    if conn is None:
+        conn = _pool.acquire()
+        conn.bound_to_request = True
+        g.db = conn
+        incr_metric("db.requests")
     return conn
 
 
-def init_db():
-    conn = get_db()
-    cur = conn.cursor()
+@contextmanager
+def transaction(conn):
+    """Run a block as one write transaction, taking the write lock up front."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        conn.bound_to_request = False
+        conn.close()
+
+
+@app.route("/admin/metrics")
+def admin_metrics():
+    if session.get("role") != "Admin":
+        return redirect(url_for("admin_login"))
+    return jsonify(metrics_snapshot())
+
+
+# ---------------- Schema ----------------
 
+# Each migration runs once, in order, inside its own transaction; the
+# database records the last applied number in PRAGMA user_version.
+
+def _migration_base_schema(cur):
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -231,72 +404,359 @@ def init_db():
         """
     )
 
-    conn.commit()
-    conn.close()
-
-
-def migrate_db():
-    conn = get_db()
-    cur = conn.cursor()
-
+    # Databases created before versioned migrations may predate these columns.
     cols = cur.execute("PRAGMA table_info(assignment_submissions)").fetchall()
-    col_names = {c[1] for c in cols}
-    if "grade_out_of_10" not in col_names:
+    if "grade_out_of_10" not in {c[1] for c in cols}:
         cur.execute("ALTER TABLE assignment_submissions ADD COLUMN grade_out_of_10 INTEGER")
 
     notif_cols = cur.execute("PRAGMA table_info(notifications)").fetchall()
-    notif_names = {c[1] for c in notif_cols}
-    if "classroom_id" not in notif_names:
+    if "classroom_id" not in {c[1] for c in notif_cols}:
         cur.execute("ALTER TABLE notifications ADD COLUMN classroom_id INTEGER")
 
+
+def _migration_secondary_indexes(cur):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_classrooms_teacher ON classrooms (teacher_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_classroom_students_student ON classroom_students (student_id, classroom_id)",
+        "CREATE INDEX IF NOT EXISTS idx_assignments_classroom ON assignments (classroom_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_assignments_lesson ON assignments (lesson_lang, lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_submissions_student ON assignment_submissions (student_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_progress_student_lang ON progress (student_id, lesson_lang, lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id, is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_classroom ON notifications (classroom_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stream_posts_classroom ON stream_posts (classroom_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_invites_classroom ON classroom_invites (classroom_id, invited_at)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_assignment ON assignment_comments (assignment_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_student ON assignment_comments (student_id, assignment_id)",
+    ):
+        cur.execute(statement)
+
+
+def _migration_catalog_tables(cur):
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS stream_posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            classroom_id INTEGER NOT NULL,
-            author_id INTEGER NOT NULL,
-            kind TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog_languages (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 0,
+            position INTEGER NOT NULL
+        );
+        """
+    )
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog_lessons (
+            row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lang_id TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
             title TEXT NOT NULL,
-            body TEXT NOT NULL,
-            audience TEXT NOT NULL,
-            student_id INTEGER,
-            created_at TEXT NOT NULL
+            xp INTEGER NOT NULL,
+            reading TEXT NOT NULL,
+            video_url TEXT NOT NULL DEFAULT '',
+            UNIQUE (lang_id, lesson_id),
+            FOREIGN KEY (lang_id) REFERENCES catalog_languages (id)
         );
         """
     )
 
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS assignment_comments (
+        CREATE TABLE IF NOT EXISTS catalog_quiz_questions (
+            lang_id TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            choices TEXT NOT NULL, -- JSON array
+            answer TEXT NOT NULL,
+            PRIMARY KEY (lang_id, lesson_id, position)
+        );
+        """
+    )
+
+    # rowid mirrors catalog_lessons.row_id
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5 (
+            title, reading, quiz, tokenize = 'porter unicode61'
+        );
+        """
+    )
+
+    cur.execute("INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0)")
+
+
+def _migration_language_versions(cur):
+    cur.execute("ALTER TABLE catalog_languages ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    cur.execute("UPDATE catalog_languages SET version = (SELECT version FROM catalog_meta WHERE id = 1)")
+
+    # Seed a fresh database from the bundled lessons.json.
+    empty = cur.execute("SELECT 1 FROM catalog_languages LIMIT 1").fetchone() is None
+    if empty and LESSONS_PATH.exists():
+        with open(LESSONS_PATH, "r", encoding="utf-8") as f:
+            import_catalog(cur, json.load(f))
+
+
+def _migration_student_stats(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_stats (
+            student_id INTEGER PRIMARY KEY,
+            total_xp INTEGER NOT NULL DEFAULT 0,
+            lessons_completed INTEGER NOT NULL DEFAULT 0,
+            language_counts TEXT NOT NULL DEFAULT '{}', -- {"python": 3, ...}
+            FOREIGN KEY (student_id) REFERENCES users (id)
+        );
+        """
+    )
+    rebuild_student_stats(cur)
+
+
+def _migration_quiz_attempts(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            assignment_id INTEGER NOT NULL,
             student_id INTEGER NOT NULL,
-            author_role TEXT NOT NULL,
-            body TEXT NOT NULL,
-            created_at TEXT NOT NULL
+            lang_id TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            answers TEXT NOT NULL, -- JSON list of the submitted choices
+            correct_count INTEGER NOT NULL,
+            question_count INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES users (id)
         );
         """
     )
 
-    conn.commit()
+    # Rollups maintained as attempt batches are flushed; never rebuilt from quiz_attempts.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quiz_lesson_stats (
+            lang_id TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            passes INTEGER NOT NULL DEFAULT 0,
+            total_score INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lang_id, lesson_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS quiz_question_stats (
+            lang_id TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lang_id, lesson_id, position)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _migration_completion_bits(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS completion_bits (
+            student_id INTEGER NOT NULL,
+            lang_id TEXT NOT NULL,
+            bits BLOB NOT NULL, -- little-endian bitset, bit (lesson_id - 1) set once passed
+            PRIMARY KEY (student_id, lang_id),
+            FOREIGN KEY (student_id) REFERENCES users (id)
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_completion_bits(cur)
+
+
+def _migration_user_badges(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_badges (
+            user_id INTEGER NOT NULL,
+            badge TEXT NOT NULL,
+            awarded_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, badge),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_user_badges(cur)
+
+
+def _migration_classroom_leaderboards(cur):
+    cur.execute("ALTER TABLE classroom_students ADD COLUMN xp INTEGER NOT NULL DEFAULT 0")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_classroom_students_xp ON classroom_students (classroom_id, xp DESC, student_id)"
+    )
+    cur.execute("ALTER TABLE classrooms ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0")
+    # How many members of a classroom sit at each XP total, so a rank is a
+    # range sum over the levels above rather than a count over members.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS classroom_xp_levels (
+            classroom_id INTEGER NOT NULL,
+            xp INTEGER NOT NULL,
+            members INTEGER NOT NULL,
+            PRIMARY KEY (classroom_id, xp)
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_leaderboards(cur)
+
+
+def _migration_language_completions(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS language_completions (
+            student_id INTEGER NOT NULL,
+            lang_id TEXT NOT NULL,
+            lesson_count INTEGER NOT NULL, -- lessons in the language when it was finished
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (student_id, lang_id),
+            FOREIGN KEY (student_id) REFERENCES users (id)
+        ) WITHOUT ROWID;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS certificates (
+            student_id INTEGER NOT NULL,
+            lang_id TEXT NOT NULL,
+            lesson_count INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            html TEXT NOT NULL,
+            pdf BLOB NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (student_id, lang_id),
+            FOREIGN KEY (student_id) REFERENCES users (id)
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_language_completions(cur)
+
+
+MIGRATIONS = [
+    (1, _migration_base_schema),
+    (2, _migration_secondary_indexes),
+    (3, _migration_catalog_tables),
+    (4, _migration_language_versions),
+    (5, _migration_student_stats),
+    (6, _migration_quiz_attempts),
+    (7, _migration_completion_bits),
+    (8, _migration_user_badges),
+    (9, _migration_classroom_leaderboards),
+    (10, _migration_language_completions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate_db():
+    conn = get_db()
+    cur = conn.cursor()
+    current = cur.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction(conn):
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {version}")
+    conn.close()
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on ``path`` shared by every process on the host."""
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def ensure_schema() -> bool:
+    """Migrate the database under the migration lock if needed; returns True if any DDL ran."""
+    conn = get_db()
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
     conn.close()
+    if current >= SCHEMA_VERSION:
+        return False
+    with file_lock(MIGRATION_LOCK_PATH):
+        migrate_db()
+    return True
+
+
+def create_app():
+    """Application factory: prepare storage for this process and return the app."""
+    started = time.perf_counter()
+    DATA_DIR.mkdir(exist_ok=True)
+    migrated = ensure_schema()
+    set_metric("startup.migrated", int(migrated))
+    set_metric("startup.seconds", round(time.perf_counter() - started, 6))
+    return app
+
+
+def warmup(shards: bool = True):
+    """Fill the per-process caches; ``shards=False`` leaves language shards to load on first use."""
+    global _static_version
+    started = time.perf_counter()
+
+    summary = get_catalog_summary()
+    if shards:
+        for lang in summary.languages:
+            get_language_catalog(lang["id"])
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    _static_version = compute_static_version()
+    for folder in ("cfm_pics", "avatars"):
+        get_avatar_options(folder)
+
+    # No SQLite handle may cross the fork.
+    _pool.close_all()
+    set_metric("startup.warmup_seconds", round(time.perf_counter() - started, 6))
 
 
 def now_ts():
     return datetime.utcnow().isoformat()
 
 
+_avatar_options: dict[str, list[str]] = {}
+
+
 def get_avatar_options(folder: str) -> list[str]:
+    if folder in _avatar_options and not app.debug:
+        return _avatar_options[folder]
     avatar_dir = BASE_DIR / "static" / folder
     if not avatar_dir.exists():
-        return []
-    allowed = {".png", ".jpg", ".jpeg", ".svg", ".webp"}
-    avatars = [
-        p.name
-        for p in avatar_dir.iterdir()
-        if p.is_file() and p.suffix.lower() in allowed
-    ]
-    return sorted(avatars)
+        avatars = []
+    else:
+        allowed = {".png", ".jpg", ".jpeg", ".svg", ".webp"}
+        avatars = sorted(
+            p.name
+            for p in avatar_dir.iterdir()
+            if p.is_file() and p.suffix.lower() in allowed
+        )
+    _avatar_options[folder] = avatars
+    return avatars
 
 @app.template_filter("fmt_dt")
 def fmt_dt(value: str | None):
@@ -327,92 +787,552 @@ def fmt_dt(value: str | None):
 
 # ---------------- Lessons ----------------
 
-def load_lessons():
-    data_path = DATA_DIR / "lessons.json"
-    with open(data_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+LESSONS_PATH = DATA_DIR / "lessons.json"
 
-def save_lessons(data: dict):
-    data_path = DATA_DIR / "lessons.json"
-    with open(data_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
 
-def save_lessons(data: dict):
-    data_path = DATA_DIR / "lessons.json"
-    with open(data_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+# The catalog lives in the catalog_* tables. catalog_languages is the
+# manifest: one row per language with the catalog version at which that
+# language last changed. Each language's lessons form a shard that a worker
+# loads on first use and keeps until that language's version moves, so
+# memory follows the tracks students actually open.
+_catalog_lock = threading.Lock()
 
 
-def get_language(lang_id: str):
-    data = load_lessons()
-    for lang in data["languages"]:
-        if lang["id"] == lang_id:
-            return lang
-    return None
+def _read_catalog_version(conn) -> int:
+    return conn.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()["version"]
 
 
-def get_lesson(lang_id: str, lesson_id: int):
-    lang = get_language(lang_id)
-    if not lang:
-        return None
-    for lesson in lang["lessons"]:
-        if lesson["id"] == lesson_id:
-            return lesson
-    return None
+def catalog_version() -> int:
+    """Current catalog version, read at most once per request."""
+    if has_app_context() and "catalog_version" in g:
+        return g.catalog_version
+    conn = get_db()
+    version = _read_catalog_version(conn)
+    conn.close()
+    if has_app_context():
+        g.catalog_version = version
+    return version
 
 
-def all_languages():
-    return load_lessons()["languages"]
+class LessonSummary(NamedTuple):
+    id: int
+    title: str
+    xp: int
 
 
-def parse_quiz_text(raw: str):
-    questions = []
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = [p.strip() for p in line.split("|")]
-        if len(parts) != 3:
-            continue
-        question, choices_raw, answer = parts
-        choices = [c.strip() for c in choices_raw.split(",") if c.strip()]
-        if len(choices) < 2:
-            continue
-        questions.append({"question": question, "choices": choices, "answer": answer})
-    return questions
+class CatalogSummary:
+    """Languages and lesson titles without readings or quizzes."""
 
+    def __init__(self, version: int, languages: list[dict]):
+        self.version = version
+        self.languages = tuple(languages)
+        self._languages = MappingProxyType({lang["id"]: lang for lang in self.languages})
 
-def quiz_to_text(quiz: list[dict]):
-    lines = []
-    for q in quiz:
-        choices = ", ".join(q["choices"])
-        lines.append(f"{q['question']} | {choices} | {q['answer']}")
-    return "\n".join(lines)
+    def language(self, lang_id: str):
+        return self._languages.get(lang_id)
 
 
-def parse_quiz_text(raw: str):
-    questions = []
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = [p.strip() for p in line.split("|")]
-        if len(parts) != 3:
-            continue
-        question, choices_raw, answer = parts
-        choices = [c.strip() for c in choices_raw.split(",") if c.strip()]
-        if len(choices) < 2:
-            continue
-        questions.append({"question": question, "choices": choices, "answer": answer})
-    return questions
+_catalog_summary: CatalogSummary | None = None
 
 
-# ---------------- Helpers ----------------
+def _read_catalog_summary(conn) -> CatalogSummary:
+    # Read the version first: if a write lands mid-read we cache newer rows
+    # under an older version and simply reload next time, never the reverse.
+    version = _read_catalog_version(conn)
+    lessons: dict[str, list] = {}
+    for row in conn.execute(
+        "SELECT lang_id, lesson_id, title, xp FROM catalog_lessons ORDER BY lang_id, lesson_id"
+    ):
+        lessons.setdefault(row["lang_id"], []).append(
+            LessonSummary(row["lesson_id"], row["title"], row["xp"])
+        )
+    languages = []
+    for row in conn.execute(
+        "SELECT id, name, description, enabled, version FROM catalog_languages ORDER BY position"
+    ):
+        lang_lessons = tuple(lessons.get(row["id"], ()))
+        languages.append(
+            MappingProxyType(
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "description": row["description"],
+                    "enabled": bool(row["enabled"]),
+                    "version": row["version"],
+                    "lesson_count": len(lang_lessons),
+                    "lessons": lang_lessons,
+                }
+            )
+        )
+    return CatalogSummary(version, languages)
 
-def require_login():
-    if "user_id" not in session:
-        return redirect(url_for("login"))
-    return None
+
+def get_catalog_summary() -> CatalogSummary:
+    """Return the summary view for the current catalog version."""
+    global _catalog_summary
+    version = catalog_version()
+    summary = _catalog_summary
+    if summary is not None and summary.version == version:
+        return summary
+
+    with _catalog_lock:
+        summary = _catalog_summary
+        if summary is None or summary.version != version:
+            conn = get_db()
+            summary = _read_catalog_summary(conn)
+            conn.close()
+            _catalog_summary = summary
+            incr_metric("catalog.summary_loads")
+        return summary
+
+
+NO_ANSWER = 0xFF
+
+
+class QuizKey:
+    """A lesson quiz compiled once per catalog version for grading."""
+
+    __slots__ = ("answers", "key", "_choice_index", "_match_tables")
+
+    def __init__(self, quiz: list[dict]):
+        self.answers = tuple(q["answer"] for q in quiz)
+        choice_index = []
+        for q in quiz:
+            index = {choice: i for i, choice in enumerate(q["choices"])}
+            # An answer that is missing from the choices still has to grade as correct.
+            index.setdefault(q["answer"], len(q["choices"]))
+            choice_index.append(index)
+        self._choice_index = tuple(choice_index)
+        self.key = bytes(index[answer] for index, answer in zip(choice_index, self.answers))
+        # Per-question translate tables: correct choice -> 1, anything else -> 0.
+        self._match_tables = tuple(bytes(int(i == k) for i in range(256)) for k in self.key)
+
+    def __len__(self):
+        return len(self.key)
+
+    def encode(self, answers) -> bytes:
+        return bytes(
+            index.get(answer, NO_ANSWER) if isinstance(answer, str) else NO_ANSWER
+            for index, answer in zip(self._choice_index, answers)
+        ).ljust(len(self.key), bytes([NO_ANSWER]))
+
+    def grade(self, answers) -> list[bool]:
+        return [a == k for a, k in zip(self.encode(answers), self.key)]
+
+    def correct_counts(self, rows: bytes) -> bytes:
+        """Number of correct answers per attempt, one byte each, for attempts packed back to back."""
+        width = len(self.key)
+        if not width or not rows:
+            return b""
+        if width > 0xFF:
+            return bytes(sum(self.grade_row(rows[i:i + width])) for i in range(0, len(rows), width))
+        count, partial = divmod(len(rows), width)
+        if partial:
+            raise ValueError("rows must hold whole attempts")
+        # Sum the 0/1 columns as big integers; a count never exceeds the
+        # question count, so no byte lane carries into its neighbour.
+        total = 0
+        for q, table in enumerate(self._match_tables):
+            total += int.from_bytes(rows[q::width].translate(table), "big")
+        return total.to_bytes(count, "big")
+
+    def grade_row(self, row: bytes) -> list[bool]:
+        return [a == k for a, k in zip(row, self.key)]
+
+
+class LanguageCatalog:
+    """Read-only shard: one language with full lesson bodies and quizzes."""
+
+    def __init__(self, version: int, language: dict):
+        self.version = version
+        self.language = language
+        self._lessons = MappingProxyType({lesson["id"]: lesson for lesson in language["lessons"]})
+        self.quiz_keys = MappingProxyType({lesson["id"]: QuizKey(lesson["quiz"]) for lesson in language["lessons"]})
+
+    def lesson(self, lesson_id: int):
+        return self._lessons.get(lesson_id)
+
+
+_language_shards: dict[str, LanguageCatalog] = {}
+
+
+def _read_language_shard(conn, lang_id: str) -> LanguageCatalog | None:
+    lang_row = conn.execute("SELECT * FROM catalog_languages WHERE id = ?", (lang_id,)).fetchone()
+    if lang_row is None:
+        return None
+
+    questions: dict[int, list] = {}
+    for row in conn.execute(
+        """
+        SELECT lesson_id, question, choices, answer
+        FROM catalog_quiz_questions
+        WHERE lang_id = ?
+        ORDER BY lesson_id, position
+        """,
+        (lang_id,),
+    ):
+        questions.setdefault(row["lesson_id"], []).append(
+            MappingProxyType(
+                {"question": row["question"], "choices": tuple(json.loads(row["choices"])), "answer": row["answer"]}
+            )
+        )
+
+    # Shards are shared by every request in the process, so nothing in them is mutable.
+    lessons = tuple(
+        MappingProxyType(
+            {
+                "id": row["lesson_id"],
+                "title": row["title"],
+                "xp": row["xp"],
+                "reading": row["reading"],
+                "video_url": row["video_url"],
+                "quiz": tuple(questions.get(row["lesson_id"], ())),
+            }
+        )
+        for row in conn.execute(
+            """
+            SELECT lesson_id, title, xp, reading, video_url
+            FROM catalog_lessons
+            WHERE lang_id = ?
+            ORDER BY lesson_id
+            """,
+            (lang_id,),
+        )
+    )
+    language = MappingProxyType(
+        {
+            "id": lang_row["id"],
+            "name": lang_row["name"],
+            "description": lang_row["description"],
+            "enabled": bool(lang_row["enabled"]),
+            "lessons": lessons,
+        }
+    )
+    return LanguageCatalog(lang_row["version"], language)
+
+
+def get_language_catalog(lang_id: str) -> LanguageCatalog | None:
+    """Return the shard for ``lang_id``, loading it on first use."""
+    entry = get_catalog_summary().language(lang_id)
+    if entry is None:
+        return None
+    shard = _language_shards.get(lang_id)
+    if shard is not None and shard.version == entry["version"]:
+        return shard
+
+    with _catalog_lock:
+        shard = _language_shards.get(lang_id)
+        if shard is None or shard.version != entry["version"]:
+            conn = get_db()
+            shard = _read_language_shard(conn, lang_id)
+            conn.close()
+            if shard is None:
+                return None
+            _language_shards[lang_id] = shard
+            incr_metric("catalog.shard_loads")
+        return shard
+
+
+def load_lessons():
+    """Assemble the whole catalog as a lessons.json-shaped dict, for exports."""
+    summary = get_catalog_summary()
+    return {
+        "version": summary.version,
+        "languages": [_thawed(get_language_catalog(lang["id"]).language) for lang in summary.languages],
+    }
+
+
+def _thawed(value):
+    """Plain dicts and lists out of a frozen catalog value, e.g. for JSON."""
+    if isinstance(value, MappingProxyType):
+        return {key: _thawed(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thawed(item) for item in value]
+    return value
+
+
+def _quiz_search_text(quiz: list[dict]) -> str:
+    return "\n".join(" ".join([q["question"], *q["choices"]]) for q in quiz)
+
+
+def _write_lesson(cur, lang_id: str, lesson: dict):
+    """Insert or replace one lesson with its quiz and search entry."""
+    cur.execute(
+        """
+        INSERT INTO catalog_lessons (lang_id, lesson_id, title, xp, reading, video_url)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(lang_id, lesson_id) DO UPDATE SET
+            title = excluded.title,
+            xp = excluded.xp,
+            reading = excluded.reading,
+            video_url = excluded.video_url
+        """,
+        (
+            lang_id,
+            lesson["id"],
+            lesson["title"],
+            lesson.get("xp", 100),
+            lesson["reading"],
+            lesson.get("video_url", ""),
+        ),
+    )
+    row_id = cur.execute(
+        "SELECT row_id FROM catalog_lessons WHERE lang_id = ? AND lesson_id = ?",
+        (lang_id, lesson["id"]),
+    ).fetchone()[0]
+
+    cur.execute(
+        "DELETE FROM catalog_quiz_questions WHERE lang_id = ? AND lesson_id = ?",
+        (lang_id, lesson["id"]),
+    )
+    cur.executemany(
+        """
+        INSERT INTO catalog_quiz_questions (lang_id, lesson_id, position, question, choices, answer)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (lang_id, lesson["id"], position, q["question"], json.dumps(q["choices"]), q["answer"])
+            for position, q in enumerate(lesson["quiz"])
+        ],
+    )
+
+    cur.execute("DELETE FROM catalog_search WHERE rowid = ?", (row_id,))
+    cur.execute(
+        "INSERT INTO catalog_search (rowid, title, reading, quiz) VALUES (?, ?, ?, ?)",
+        (row_id, lesson["title"], lesson["reading"], _quiz_search_text(lesson["quiz"])),
+    )
+
+
+def _bump_catalog_version(cur, lang_id: str | None = None):
+    """Advance the catalog version and stamp it on ``lang_id`` (or every language)."""
+    cur.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+    stamp = "UPDATE catalog_languages SET version = (SELECT version FROM catalog_meta WHERE id = 1)"
+    if lang_id is None:
+        cur.execute(stamp)
+    else:
+        cur.execute(stamp + " WHERE id = ?", (lang_id,))
+    if has_app_context():
+        g.pop("catalog_version", None)
+
+
+def import_catalog(cur, data: dict):
+    """Replace the catalog tables with the contents of a lessons.json dict."""
+    old_quizzes: dict[tuple, list] = {}
+    for row in cur.execute(
+        "SELECT lang_id, lesson_id, question, choices, answer FROM catalog_quiz_questions ORDER BY lang_id, lesson_id, position"
+    ).fetchall():
+        old_quizzes.setdefault((row[0], row[1]), []).append((row[2], json.loads(row[3]), row[4]))
+    for table in ("catalog_search", "catalog_quiz_questions", "catalog_lessons", "catalog_languages"):
+        cur.execute(f"DELETE FROM {table}")
+    for position, lang in enumerate(data["languages"]):
+        cur.execute(
+            """
+            INSERT INTO catalog_languages (id, name, description, enabled, position)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (lang["id"], lang["name"], lang.get("description", ""), int(lang.get("enabled", False)), position),
+        )
+        for lesson in lang["lessons"]:
+            _write_lesson(cur, lang["id"], lesson)
+
+    # As in update_lesson: per-question miss rates describe the old questions.
+    new_quizzes = {
+        (lang["id"], lesson["id"]): [(q["question"], q["choices"], q["answer"]) for q in lesson["quiz"]]
+        for lang in data["languages"]
+        for lesson in lang["lessons"]
+    }
+    changed = [key for key, quiz in old_quizzes.items() if new_quizzes.get(key) != quiz]
+    if changed:
+        cur.executemany("DELETE FROM quiz_question_stats WHERE lang_id = ? AND lesson_id = ?", changed)
+    cur.execute(
+        "INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, ?)",
+        (data.get("version", 0),),
+    )
+    _bump_catalog_version(cur)
+
+
+def add_language(lang: dict):
+    conn = get_db()
+    with transaction(conn):
+        if conn.execute("SELECT 1 FROM catalog_languages WHERE id = ?", (lang["id"],)).fetchone():
+            raise ValueError(f"Language {lang['id']!r} already exists.")
+        conn.execute(
+            """
+            INSERT INTO catalog_languages (id, name, description, enabled, position)
+            VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM catalog_languages))
+            """,
+            (lang["id"], lang["name"], lang["description"], int(lang["enabled"])),
+        )
+        _bump_catalog_version(conn, lang["id"])
+    conn.close()
+
+
+def set_language_enabled(lang_id: str, enabled: bool):
+    conn = get_db()
+    with transaction(conn):
+        conn.execute(
+            "UPDATE catalog_languages SET enabled = ? WHERE id = ?",
+            (int(enabled), lang_id),
+        )
+        _bump_catalog_version(conn, lang_id)
+    conn.close()
+
+
+def add_lesson(lang_id: str, fields: dict) -> int:
+    """Append a lesson with the next free id and return that id."""
+    conn = get_db()
+    with transaction(conn):
+        new_id = conn.execute(
+            "SELECT COALESCE(MAX(lesson_id), 0) + 1 FROM catalog_lessons WHERE lang_id = ?",
+            (lang_id,),
+        ).fetchone()[0]
+        _write_lesson(conn, lang_id, {"id": new_id, **fields})
+        _bump_catalog_version(conn, lang_id)
+    conn.close()
+    return new_id
+
+
+def update_lesson(lang_id: str, lesson_id: int, fields: dict):
+    conn = get_db()
+    with transaction(conn):
+        _write_lesson(conn, lang_id, {"id": lesson_id, **fields})
+        if "quiz" in fields:
+            # Per-question miss rates describe the old questions; start them over.
+            conn.execute(
+                "DELETE FROM quiz_question_stats WHERE lang_id = ? AND lesson_id = ?",
+                (lang_id, lesson_id),
+            )
+        _bump_catalog_version(conn, lang_id)
+    conn.close()
+
+
+def write_lessons_json(data: dict, path: Path = LESSONS_PATH):
+    """Atomically replace ``path`` with a JSON export of ``data``."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, indent=2, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@app.cli.command("export-catalog")
+def export_catalog_command():
+    """Write the catalog tables back out to data/lessons.json."""
+    data = load_lessons()
+    write_lessons_json(data)
+    click.echo(f"Exported catalog version {data['version']} to {LESSONS_PATH}.")
+
+
+@app.cli.command("import-catalog")
+@click.confirmation_option(
+    prompt="Replace the whole catalog with data/lessons.json? Admin edits not yet exported will be lost."
+)
+def import_catalog_command():
+    """Replace the catalog tables with the contents of data/lessons.json."""
+    with open(LESSONS_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    conn = get_db()
+    with transaction(conn):
+        import_catalog(conn, data)
+    conn.close()
+    click.echo(f"Imported catalog version {catalog_version()} from {LESSONS_PATH}.")
+
+
+def _search_query(raw: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    words = re.findall(r"\w+", raw)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words[:-1]]
+    terms.append(f'"{words[-1]}"*')
+    return " ".join(terms)
+
+
+def search_lessons(raw: str, limit: int = 20):
+    query = _search_query(raw)
+    if not query:
+        return []
+    conn = get_db()
+    rows = conn.execute(
+        """
+        SELECT l.lang_id, l.lesson_id, l.title, l.xp, lang.name AS lang_name,
+               snippet(catalog_search, 1, '', '', '…', 16) AS snippet
+        FROM catalog_search
+        JOIN catalog_lessons l ON l.row_id = catalog_search.rowid
+        JOIN catalog_languages lang ON lang.id = l.lang_id
+        WHERE catalog_search MATCH ? AND lang.enabled = 1
+        ORDER BY catalog_search.rank
+        LIMIT ?
+        """,
+        (query, limit),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def get_language(lang_id: str):
+    shard = get_language_catalog(lang_id)
+    return shard.language if shard else None
+
+
+def get_lesson(lang_id: str, lesson_id: int):
+    shard = get_language_catalog(lang_id)
+    return shard.lesson(lesson_id) if shard else None
+
+
+def all_languages():
+    return get_catalog_summary().languages
+
+
+def parse_quiz_text(raw: str):
+    questions = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) != 3:
+            continue
+        question, choices_raw, answer = parts
+        choices = [c.strip() for c in choices_raw.split(",") if c.strip()]
+        if len(choices) < 2:
+            continue
+        questions.append({"question": question, "choices": choices, "answer": answer})
+    return questions
+
+
+def quiz_to_text(quiz: list[dict]):
+    lines = []
+    for q in quiz:
+        choices = ", ".join(q["choices"])
+        lines.append(f"{q['question']} | {choices} | {q['answer']}")
+    return "\n".join(lines)
+
+
+def parse_quiz_text(raw: str):
+    questions = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) != 3:
+            continue
+        question, choices_raw, answer = parts
+        choices = [c.strip() for c in choices_raw.split(",") if c.strip()]
+        if len(choices) < 2:
+            continue
+        questions.append({"question": question, "choices": choices, "answer": answer})
+    return questions
+
+
+# ---------------- Helpers ----------------
+
+def require_login():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+    return None
 
 
 def require_role(role: str):
@@ -433,24 +1353,676 @@ def get_user(user_id: int):
     return user
 
 
-def get_student_progress(user_id: int, lang_id: str):
+class CompletionBits:
+    """The lessons one student has passed in one language, as an integer bitset."""
+
+    __slots__ = ("bits", "count")
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+        self.count = bits.bit_count()
+
+    @classmethod
+    def from_blob(cls, blob: bytes | None) -> "CompletionBits":
+        return cls(int.from_bytes(blob, "little") if blob else 0)
+
+    def to_blob(self) -> bytes:
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8 or 1, "little")
+
+    def with_lesson(self, lesson_id: int) -> "CompletionBits":
+        return CompletionBits(self.bits | (1 << (lesson_id - 1)))
+
+    def __contains__(self, lesson_id) -> bool:
+        return isinstance(lesson_id, int) and lesson_id > 0 and bool(self.bits >> (lesson_id - 1) & 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def is_unlocked(self, lesson_id: int) -> bool:
+        """Lessons unlock in order: anything passed, plus the next one."""
+        return lesson_id <= self.count + 1 or lesson_id in self
+
+    def percent(self, lesson_count: int) -> int:
+        return self.count * 100 // (lesson_count or 1)
+
+
+def get_completion_bits(user_id: int, lang_id: str) -> CompletionBits:
     conn = get_db()
-    rows = conn.execute(
-        "SELECT lesson_id FROM progress WHERE student_id = ? AND lesson_lang = ?",
+    row = conn.execute(
+        "SELECT bits FROM completion_bits WHERE student_id = ? AND lang_id = ?",
         (user_id, lang_id),
-    ).fetchall()
+    ).fetchone()
     conn.close()
-    return {row["lesson_id"] for row in rows}
+    return CompletionBits.from_blob(row["bits"] if row else None)
 
 
-def get_total_xp(user_id: int):
+def record_completion_bit(conn, user_id: int, lang_id: str, lesson_id: int) -> CompletionBits:
+    """Set one lesson's bit; call inside the quiz-pass transaction with the progress insert."""
+    row = conn.execute(
+        "SELECT bits FROM completion_bits WHERE student_id = ? AND lang_id = ?",
+        (user_id, lang_id),
+    ).fetchone()
+    bits = CompletionBits.from_blob(row["bits"] if row else None).with_lesson(lesson_id)
+    conn.execute(
+        """
+        INSERT INTO completion_bits (student_id, lang_id, bits) VALUES (?, ?, ?)
+        ON CONFLICT(student_id, lang_id) DO UPDATE SET bits = excluded.bits
+        """,
+        (user_id, lang_id, bits.to_blob()),
+    )
+    return bits
+
+
+def rebuild_completion_bits(cur):
+    """Recompute completion_bits from scratch out of progress."""
+    bitsets: dict[tuple, int] = {}
+    for student_id, lang_id, lesson_id in cur.execute(
+        "SELECT student_id, lesson_lang, lesson_id FROM progress WHERE lesson_id > 0"
+    ).fetchall():
+        key = (student_id, lang_id)
+        bitsets[key] = bitsets.get(key, 0) | (1 << (lesson_id - 1))
+    cur.execute("DELETE FROM completion_bits")
+    cur.executemany(
+        "INSERT INTO completion_bits (student_id, lang_id, bits) VALUES (?, ?, ?)",
+        [(student_id, lang_id, CompletionBits(bits).to_blob()) for (student_id, lang_id), bits in bitsets.items()],
+    )
+
+
+@app.cli.command("rebuild-completion-bits")
+def rebuild_completion_bits_command():
+    """Backfill completion_bits from the progress table."""
     conn = get_db()
-    total = conn.execute(
-        "SELECT COALESCE(SUM(xp), 0) as total FROM progress WHERE student_id = ?",
+    with transaction(conn):
+        rebuild_completion_bits(conn)
+    count = conn.execute("SELECT COUNT(*) FROM completion_bits").fetchone()[0]
+    conn.close()
+    click.echo(f"Rebuilt completion bits for {count} student languages.")
+
+
+def get_student_stats(user_id: int) -> dict:
+    """Totals kept in student_stats: XP, lessons completed, per-language counts."""
+    conn = get_db()
+    row = conn.execute(
+        "SELECT total_xp, lessons_completed, language_counts FROM student_stats WHERE student_id = ?",
         (user_id,),
-    ).fetchone()["total"]
+    ).fetchone()
+    conn.close()
+    if row is None:
+        return {"total_xp": 0, "lessons_completed": 0, "language_counts": {}}
+    return {
+        "total_xp": row["total_xp"],
+        "lessons_completed": row["lessons_completed"],
+        "language_counts": json.loads(row["language_counts"]),
+    }
+
+
+def record_progress_stats(conn, user_id: int, lang_id: str, xp: int):
+    """Fold one newly completed lesson into student_stats in the progress insert's transaction."""
+    lang_path = f'$."{lang_id}"'
+    conn.execute(
+        """
+        INSERT INTO student_stats (student_id, total_xp, lessons_completed, language_counts)
+        VALUES (?, ?, 1, json_object(?, 1))
+        ON CONFLICT(student_id) DO UPDATE SET
+            total_xp = total_xp + excluded.total_xp,
+            lessons_completed = lessons_completed + 1,
+            language_counts = json_set(
+                language_counts, ?, COALESCE(json_extract(language_counts, ?), 0) + 1
+            )
+        """,
+        (user_id, xp, lang_id, lang_path, lang_path),
+    )
+
+
+def rebuild_student_stats(cur):
+    """Recompute student_stats from scratch out of progress."""
+    cur.execute("DELETE FROM student_stats")
+    cur.execute(
+        """
+        INSERT INTO student_stats (student_id, total_xp, lessons_completed, language_counts)
+        SELECT student_id, SUM(xp), SUM(completed), json_group_object(lesson_lang, completed)
+        FROM (
+            SELECT student_id, lesson_lang, SUM(xp) AS xp, COUNT(*) AS completed
+            FROM progress
+            GROUP BY student_id, lesson_lang
+        )
+        GROUP BY student_id
+        """
+    )
+
+
+@app.cli.command("rebuild-student-stats")
+def rebuild_student_stats_command():
+    """Backfill student_stats from the progress table."""
+    conn = get_db()
+    with transaction(conn):
+        rebuild_student_stats(conn)
+    count = conn.execute("SELECT COUNT(*) FROM student_stats").fetchone()[0]
+    conn.close()
+    click.echo(f"Rebuilt stats for {count} students.")
+
+
+class BadgeRule(NamedTuple):
+    name: str
+    event: str
+    check: object  # callable(ctx: dict) -> bool
+
+
+# Rules run only when their event fires, inside the transaction that caused
+# it, and awards are stored in user_badges; the dashboard never evaluates them.
+#   quiz_passed        ctx: lessons_completed
+#   streak_extended    ctx: streak
+#   language_completed ctx: lang_id, lesson_count
+BADGE_RULES = [
+    BadgeRule("First Lesson", "quiz_passed", lambda ctx: ctx["lessons_completed"] >= 1),
+    BadgeRule("3 Lessons", "quiz_passed", lambda ctx: ctx["lessons_completed"] >= 3),
+    BadgeRule("Python Explorer", "quiz_passed", lambda ctx: ctx["lessons_completed"] >= 5),
+    BadgeRule("3-Day Streak", "streak_extended", lambda ctx: ctx["streak"] >= 3),
+    BadgeRule("7-Day Streak", "streak_extended", lambda ctx: ctx["streak"] >= 7),
+    BadgeRule("Course Finisher", "language_completed", lambda ctx: ctx["lesson_count"] > 0),
+]
+
+_badge_rules_by_event: dict[str, list[BadgeRule]] = {}
+for _rule in BADGE_RULES:
+    _badge_rules_by_event.setdefault(_rule.event, []).append(_rule)
+
+
+def award_badges(conn, user_id: int, event: str, **ctx) -> list[str]:
+    """Store the badges ``event`` newly earns and return their names; the caller commits."""
+    awarded = []
+    for rule in _badge_rules_by_event.get(event, ()):
+        if not rule.check(ctx):
+            continue
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO user_badges (user_id, badge, awarded_at) VALUES (?, ?, ?)",
+            (user_id, rule.name, now_ts()),
+        )
+        if cur.rowcount == 1:
+            awarded.append(rule.name)
+    return awarded
+
+
+def get_user_badges(user_id: int) -> list[str]:
+    conn = get_db()
+    rows = conn.execute(
+        "SELECT badge FROM user_badges WHERE user_id = ? ORDER BY awarded_at, badge",
+        (user_id,),
+    ).fetchall()
+    conn.close()
+    return [row["badge"] for row in rows]
+
+
+def rebuild_user_badges(cur):
+    """Award every badge current data qualifies for; existing awards are kept."""
+    lesson_counts = dict(cur.execute("SELECT lang_id, COUNT(*) FROM catalog_lessons GROUP BY lang_id").fetchall())
+    students = cur.execute(
+        """
+        SELECT u.id, u.streak_count, COALESCE(ss.lessons_completed, 0)
+        FROM users u
+        LEFT JOIN student_stats ss ON ss.student_id = u.id
+        WHERE u.role = 'Student'
+        """
+    ).fetchall()
+    for user_id, streak, lessons_completed in students:
+        award_badges(cur, user_id, "quiz_passed", lessons_completed=lessons_completed)
+        award_badges(cur, user_id, "streak_extended", streak=streak or 0)
+    for user_id, lang_id, blob in cur.execute("SELECT student_id, lang_id, bits FROM completion_bits").fetchall():
+        lesson_count = lesson_counts.get(lang_id, 0)
+        if lesson_count and len(CompletionBits.from_blob(blob)) >= lesson_count:
+            award_badges(cur, user_id, "language_completed", lang_id=lang_id, lesson_count=lesson_count)
+
+
+@app.cli.command("rebuild-user-badges")
+def rebuild_user_badges_command():
+    """Backfill user_badges for rules added since students earned them."""
+    conn = get_db()
+    with transaction(conn):
+        rebuild_user_badges(conn)
+    count = conn.execute("SELECT COUNT(*) FROM user_badges").fetchone()[0]
+    conn.close()
+    click.echo(f"{count} badges awarded in total.")
+
+
+def record_leaderboard_xp(conn, student_id: int, xp: int):
+    """Move the student up ``xp`` in every classroom they belong to; the caller commits."""
+    conn.execute(
+        """
+        UPDATE classroom_xp_levels SET members = members - 1
+        WHERE (classroom_id, xp) IN (
+            SELECT classroom_id, xp FROM classroom_students WHERE student_id = ?
+        )
+        """,
+        (student_id,),
+    )
+    # Only the levels just decremented can have emptied; must run before the xp moves.
+    conn.execute(
+        """
+        DELETE FROM classroom_xp_levels
+        WHERE (classroom_id, xp) IN (
+            SELECT classroom_id, xp FROM classroom_students WHERE student_id = ?
+        ) AND members <= 0
+        """,
+        (student_id,),
+    )
+    conn.execute("UPDATE classroom_students SET xp = xp + ? WHERE student_id = ?", (xp, student_id))
+    conn.execute(
+        """
+        INSERT INTO classroom_xp_levels (classroom_id, xp, members)
+        SELECT classroom_id, xp, 1 FROM classroom_students WHERE student_id = ?
+        ON CONFLICT(classroom_id, xp) DO UPDATE SET members = members + 1
+        """,
+        (student_id,),
+    )
+
+
+def rebuild_leaderboards(cur):
+    """Recompute member XP, XP levels and member counts for every classroom."""
+    cur.execute(
+        """
+        UPDATE classroom_students
+        SET xp = COALESCE((SELECT total_xp FROM student_stats ss WHERE ss.student_id = classroom_students.student_id), 0)
+        """
+    )
+    cur.execute("DELETE FROM classroom_xp_levels")
+    cur.execute(
+        """
+        INSERT INTO classroom_xp_levels (classroom_id, xp, members)
+        SELECT classroom_id, xp, COUNT(*) FROM classroom_students GROUP BY classroom_id, xp
+        """
+    )
+    cur.execute(
+        """
+        UPDATE classrooms
+        SET member_count = (SELECT COUNT(*) FROM classroom_students cs WHERE cs.classroom_id = classrooms.id)
+        """
+    )
+
+
+@app.cli.command("rebuild-leaderboards")
+def rebuild_leaderboards_command():
+    """Backfill classroom leaderboards, e.g. after rebuild-student-stats."""
+    conn = get_db()
+    with transaction(conn):
+        rebuild_leaderboards(conn)
+    count = conn.execute("SELECT COUNT(*) FROM classroom_xp_levels").fetchone()[0]
+    conn.close()
+    click.echo(f"Rebuilt {count} classroom XP levels.")
+
+
+def get_leaderboard(classroom_id: int, limit: int = 10) -> list[dict]:
+    """Top ``limit`` members by XP; ties share a rank (1, 2, 2, 4, ...)."""
+    conn = get_db()
+    rows = conn.execute(
+        """
+        SELECT cs.student_id, cs.xp, u.name, u.username
+        FROM classroom_students cs JOIN users u ON u.id = cs.student_id
+        WHERE cs.classroom_id = ? ORDER BY cs.xp DESC, cs.student_id LIMIT ?
+        """,
+        (classroom_id, limit),
+    ).fetchall()
+    conn.close()
+
+    board = []
+    for position, row in enumerate(rows, start=1):
+        tied = board and board[-1]["xp"] == row["xp"]
+        board.append({**dict(row), "rank": board[-1]["rank"] if tied else position})
+    return board
+
+
+def get_classroom_rank(classroom_id: int, student_id: int) -> dict | None:
+    """The student's XP and rank in one classroom, or None if not a member."""
+    conn = get_db()
+    member = conn.execute(
+        """
+        SELECT cs.xp, c.member_count FROM classroom_students cs
+        JOIN classrooms c ON c.id = cs.classroom_id
+        WHERE cs.classroom_id = ? AND cs.student_id = ?
+        """,
+        (classroom_id, student_id),
+    ).fetchone()
+    if member is None:
+        conn.close()
+        return None
+    ahead = conn.execute(
+        "SELECT COALESCE(SUM(members), 0) FROM classroom_xp_levels WHERE classroom_id = ? AND xp > ?",
+        (classroom_id, member["xp"]),
+    ).fetchone()[0]
+    conn.close()
+    return {"xp": member["xp"], "rank": ahead + 1, "members": member["member_count"]}
+
+
+def record_language_completion(conn, user_id: int, lang_id: str, lesson_count: int):
+    """Mark the language finished at its current size; call in the transaction that passed the last lesson."""
+    conn.execute(
+        """
+        INSERT INTO language_completions (student_id, lang_id, lesson_count, completed_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(student_id, lang_id) DO UPDATE SET
+            lesson_count = excluded.lesson_count,
+            completed_at = excluded.completed_at
+        WHERE excluded.lesson_count > language_completions.lesson_count
+        """,
+        (user_id, lang_id, lesson_count, now_ts()),
+    )
+
+
+def rebuild_language_completions(cur):
+    """Record a completion for every student whose bitset covers a whole language."""
+    lesson_counts = dict(cur.execute("SELECT lang_id, COUNT(*) FROM catalog_lessons GROUP BY lang_id").fetchall())
+    for user_id, lang_id, blob in cur.execute("SELECT student_id, lang_id, bits FROM completion_bits").fetchall():
+        lesson_count = lesson_counts.get(lang_id, 0)
+        if lesson_count and len(CompletionBits.from_blob(blob)) >= lesson_count:
+            record_language_completion(cur, user_id, lang_id, lesson_count)
+
+
+def has_completed_language(user_id: int, lang: dict) -> bool:
+    """True if the student finished every lesson the language has now."""
+    conn = get_db()
+    row = conn.execute(
+        "SELECT lesson_count FROM language_completions WHERE student_id = ? AND lang_id = ?",
+        (user_id, lang["id"]),
+    ).fetchone()
+    conn.close()
+    return row is not None and lang["lesson_count"] > 0 and row["lesson_count"] >= lang["lesson_count"]
+
+
+def _pdf_text(value: str) -> str:
+    value = value.encode("latin-1", "replace").decode("latin-1")
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_certificate_pdf(name: str, course: str, issued: str) -> bytes:
+    """A one-page landscape certificate, written as a bare PDF with the built-in Helvetica."""
+    width, height = 792, 612
+    lines = [
+        ("F2", 34, 430, "Certificate of Completion"),
+        ("F1", 16, 375, "This certifies that"),
+        ("F2", 28, 330, name),
+        ("F1", 16, 285, "has successfully completed"),
+        ("F2", 22, 245, course),
+        ("F1", 12, 150, f"Issued {issued}"),
+        ("F1", 12, 130, "CodeCourse by Code For ME"),
+    ]
+    ops = ["q 3 w 0.2 0.3 0.6 RG 30 30 732 552 re S 0.75 w 42 42 708 528 re S Q"]
+    for font, size, y, text in lines:
+        # Helvetica averages about half an em per glyph; close enough to centre a line.
+        x = max(40, (width - len(text) * size * 0.5) / 2)
+        ops.append(f"BT /{font} {size} Tf {x:.1f} {y} Td ({_pdf_text(text)}) Tj ET")
+    content = "\n".join(ops).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            "/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>"
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def get_certificate(user_id: int, name: str, lang: dict):
+    """The cached certificate row (html, pdf), rendering it on first use."""
+    conn = get_db()
+    row = conn.execute(
+        "SELECT html, pdf FROM certificates WHERE student_id = ? AND lang_id = ? AND lesson_count = ? AND name = ?",
+        (user_id, lang["id"], lang["lesson_count"], name),
+    ).fetchone()
+    if row is not None:
+        conn.close()
+        incr_metric("certificates.cache_hits")
+        return row
+
+    course = f"{lang['name']} Basics"
+    html = render_template("_certificate.html", name=name, course=course)
+    pdf = build_certificate_pdf(name, course, date.today().strftime("%B %d, %Y"))
+    with transaction(conn):
+        conn.execute(
+            """
+            INSERT INTO certificates (student_id, lang_id, lesson_count, name, html, pdf, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(student_id, lang_id) DO UPDATE SET
+                lesson_count = excluded.lesson_count,
+                name = excluded.name,
+                html = excluded.html,
+                pdf = excluded.pdf,
+                created_at = excluded.created_at
+            """,
+            (user_id, lang["id"], lang["lesson_count"], name, html, pdf, now_ts()),
+        )
+    conn.close()
+    incr_metric("certificates.rendered")
+    return {"html": html, "pdf": pdf}
+
+
+ATTEMPT_FLUSH_SIZE = 50
+ATTEMPT_FLUSH_SECONDS = 5.0
+ATTEMPT_BUFFER_MAX = 5000
+
+_attempt_lock = threading.Lock()
+_attempt_wakeup = threading.Event()
+_attempt_buffer: list[tuple] = []
+_attempt_buffer_started = 0.0
+_attempt_retry_at = 0.0
+_attempt_flusher: threading.Thread | None = None
+
+
+def record_quiz_attempt(user_id: int, lang_id: str, lesson_id: int, answers: list, marks: list[bool], score: int, passed: bool):
+    """Queue one graded attempt for this process's background flusher."""
+    global _attempt_buffer_started
+    row = (user_id, lang_id, lesson_id, json.dumps(answers), tuple(marks), score, int(passed), now_ts())
+    with _attempt_lock:
+        if not _attempt_buffer:
+            _attempt_buffer_started = time.monotonic()
+        _attempt_buffer.append(row)
+        dropped = _trim_attempt_buffer()
+        full = len(_attempt_buffer) >= ATTEMPT_FLUSH_SIZE
+    if dropped:
+        incr_metric("quiz_attempts.dropped", dropped)
+    _start_attempt_flusher()
+    if full:
+        _attempt_wakeup.set()
+
+
+def _trim_attempt_buffer() -> int:
+    # Call with _attempt_lock held. Oldest rows go first if the database stays unwritable.
+    dropped = max(0, len(_attempt_buffer) - ATTEMPT_BUFFER_MAX)
+    del _attempt_buffer[:dropped]
+    return dropped
+
+
+def _start_attempt_flusher():
+    global _attempt_flusher
+    with _attempt_lock:
+        # A thread started before a fork is not alive in the child.
+        if _attempt_flusher is not None and _attempt_flusher.is_alive():
+            return
+        _attempt_flusher = threading.Thread(target=_flush_quiz_attempts_forever, name="quiz-attempt-flusher", daemon=True)
+        _attempt_flusher.start()
+
+
+def _flush_quiz_attempts_forever():
+    while True:
+        _attempt_wakeup.wait(ATTEMPT_FLUSH_SECONDS)
+        _attempt_wakeup.clear()
+        flush_quiz_attempts_if_due()
+
+
+def flush_quiz_attempts_if_due():
+    now = time.monotonic()
+    with _attempt_lock:
+        # After a failed flush only time brings the next attempt, however full the buffer.
+        due = (
+            bool(_attempt_buffer)
+            and now >= _attempt_retry_at
+            and (len(_attempt_buffer) >= ATTEMPT_FLUSH_SIZE or now - _attempt_buffer_started >= ATTEMPT_FLUSH_SECONDS)
+        )
+    if due:
+        _flush_quiz_attempts_quietly()
+
+
+def _flush_quiz_attempts_quietly():
+    try:
+        flush_quiz_attempts()
+    except sqlite3.Error:
+        app.logger.warning("Quiz attempt flush failed; %d attempts stay buffered", len(_attempt_buffer), exc_info=True)
+        incr_metric("quiz_attempts.flush_errors")
+
+
+def flush_quiz_attempts() -> int:
+    """Write buffered attempts and fold them into the rollups in one transaction."""
+    global _attempt_buffer, _attempt_retry_at
+    with _attempt_lock:
+        rows, _attempt_buffer = _attempt_buffer, []
+    if not rows:
+        return 0
+
+    lesson_totals: dict[tuple, list[int]] = {}
+    question_totals: dict[tuple, list[int]] = {}
+    for _, lang_id, lesson_id, _, marks, score, passed, _ in rows:
+        totals = lesson_totals.setdefault((lang_id, lesson_id), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += passed
+        totals[2] += score
+        for position, correct in enumerate(marks):
+            q_totals = question_totals.setdefault((lang_id, lesson_id, position), [0, 0])
+            q_totals[0] += 1
+            q_totals[1] += not correct
+
+    # A pooled connection of our own: this runs on the flusher thread and at exit.
+    conn = _pool.acquire()
+    try:
+        with transaction(conn):
+            conn.executemany(
+                """
+                INSERT INTO quiz_attempts (
+                    student_id, lang_id, lesson_id, answers, correct_count,
+                    question_count, score, passed, created_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (user_id, lang_id, lesson_id, answers, sum(marks), len(marks), score, passed, created_at)
+                    for user_id, lang_id, lesson_id, answers, marks, score, passed, created_at in rows
+                ],
+            )
+            conn.executemany(
+                """
+                INSERT INTO quiz_lesson_stats (lang_id, lesson_id, attempts, passes, total_score)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(lang_id, lesson_id) DO UPDATE SET
+                    attempts = attempts + excluded.attempts,
+                    passes = passes + excluded.passes,
+                    total_score = total_score + excluded.total_score
+                """,
+                [(*key, *totals) for key, totals in lesson_totals.items()],
+            )
+            conn.executemany(
+                """
+                INSERT INTO quiz_question_stats (lang_id, lesson_id, position, attempts, misses)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(lang_id, lesson_id, position) DO UPDATE SET
+                    attempts = attempts + excluded.attempts,
+                    misses = misses + excluded.misses
+                """,
+                [(*key, *totals) for key, totals in question_totals.items()],
+            )
+    except sqlite3.Error:
+        # Put the batch back so a later flush retries it, one interval from now.
+        with _attempt_lock:
+            _attempt_buffer[:0] = rows
+            dropped = _trim_attempt_buffer()
+            _attempt_retry_at = time.monotonic() + ATTEMPT_FLUSH_SECONDS
+        if dropped:
+            incr_metric("quiz_attempts.dropped", dropped)
+        raise
+    finally:
+        conn.close()
+
+    incr_metric("quiz_attempts.flushed", len(rows))
+    return len(rows)
+
+
+atexit.register(flush_quiz_attempts)
+
+
+def get_quiz_difficulty(lessons) -> dict[tuple, dict]:
+    """Attempt rollups for the given (lang_id, lesson_id) pairs, hardest questions first."""
+    keys = list(dict.fromkeys((lang_id, int(lesson_id)) for lang_id, lesson_id in lessons))
+    if not keys:
+        return {}
+    match = " OR ".join("(qs.lang_id = ? AND qs.lesson_id = ?)" for _ in keys)
+    params = [value for key in keys for value in key]
+
+    conn = get_db()
+    difficulty = {}
+    for row in conn.execute(f"SELECT * FROM quiz_lesson_stats qs WHERE {match}", params).fetchall():
+        difficulty[(row["lang_id"], row["lesson_id"])] = {
+            "attempts": row["attempts"],
+            "pass_rate": round(100 * row["passes"] / row["attempts"]) if row["attempts"] else 0,
+            "average_score": round(row["total_score"] / row["attempts"]) if row["attempts"] else 0,
+            "questions": [],
+        }
+    question_rows = conn.execute(
+        f"""
+        SELECT qs.lang_id, qs.lesson_id, qs.position, qs.attempts, qs.misses, q.question
+        FROM quiz_question_stats qs
+        JOIN catalog_quiz_questions q
+          ON q.lang_id = qs.lang_id AND q.lesson_id = qs.lesson_id AND q.position = qs.position
+        WHERE {match}
+        ORDER BY CAST(qs.misses AS REAL) / qs.attempts DESC, qs.position
+        """,
+        params,
+    ).fetchall()
     conn.close()
-    return total
+
+    for row in question_rows:
+        entry = difficulty.get((row["lang_id"], row["lesson_id"]))
+        if entry is not None:
+            entry["questions"].append(
+                {
+                    "position": row["position"],
+                    "question": row["question"],
+                    "attempts": row["attempts"],
+                    "miss_rate": round(100 * row["misses"] / row["attempts"]),
+                }
+            )
+    return difficulty
+
+
+def get_hardest_questions(limit: int = 10, min_attempts: int = 5) -> list:
+    """The catalog questions students miss most, read from the rollup table."""
+    conn = get_db()
+    rows = conn.execute(
+        """
+        SELECT qs.lang_id, qs.lesson_id, qs.position, qs.attempts, qs.misses,
+               ROUND(100.0 * qs.misses / qs.attempts) AS miss_rate,
+               q.question, l.title AS lesson_title
+        FROM quiz_question_stats qs
+        JOIN catalog_quiz_questions q
+          ON q.lang_id = qs.lang_id AND q.lesson_id = qs.lesson_id AND q.position = qs.position
+        JOIN catalog_lessons l ON l.lang_id = qs.lang_id AND l.lesson_id = qs.lesson_id
+        WHERE qs.attempts >= ?
+        ORDER BY CAST(qs.misses AS REAL) / qs.attempts DESC, qs.attempts DESC
+        LIMIT ?
+        """,
+        (min_attempts, limit),
+    ).fetchall()
+    conn.close()
+    return rows
 
 
 def create_notification(user_id: int, title: str, body: str, classroom_id: int | None = None):
@@ -466,6 +2038,18 @@ def create_notification(user_id: int, title: str, body: str, classroom_id: int |
     conn.close()
 
 
+def notify_classroom(conn, classroom_id: int, title: str, body: str) -> int:
+    """Notify every student in a classroom with one INSERT ... SELECT; the caller commits."""
+    cur = conn.execute(
+        """
+        INSERT INTO notifications (user_id, title, body, classroom_id, created_at)
+        SELECT student_id, ?, ?, classroom_id, ? FROM classroom_students WHERE classroom_id = ?
+        """,
+        (title, body, now_ts(), classroom_id),
+    )
+    return cur.rowcount
+
+
 def get_unread_notifications(user_id: int):
     conn = get_db()
     rows = conn.execute(
@@ -541,68 +2125,176 @@ def get_stream_posts_for_student(classroom_ids: list[int], student_id: int):
     return rows
 
 
-def update_streak(user_id: int):
+def update_streak(conn, user_id: int) -> int:
+    """Advance the user's streak and return it; the caller commits."""
     today = date.today()
-    conn = get_db()
     row = conn.execute(
-        "SELECT streak_count, last_active_date FROM users WHERE id = ?",
-        (user_id,),
+        """
+        UPDATE users
+        SET streak_count = CASE
+                WHEN last_active_date = :today THEN streak_count
+                WHEN last_active_date = :yesterday THEN COALESCE(streak_count, 0) + 1
+                ELSE 1
+            END,
+            last_active_date = :today
+        WHERE id = :user_id
+        RETURNING streak_count
+        """,
+        {"today": today.isoformat(), "yesterday": (today - timedelta(days=1)).isoformat(), "user_id": user_id},
     ).fetchone()
+    return row["streak_count"] if row else 0
+
+
+def reset_expired_streaks(conn) -> int:
+    """Zero every streak whose owner missed a day; the caller commits."""
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    cur = conn.execute(
+        """
+        UPDATE users SET streak_count = 0
+        WHERE streak_count > 0
+        AND (last_active_date IS NULL OR last_active_date < ?)
+        """,
+        (yesterday,),
+    )
+    return cur.rowcount
+
+
+@app.cli.command("reset-streaks")
+def reset_streaks_command():
+    """Nightly job: reset streaks that were not extended yesterday or today."""
+    conn = get_db()
+    with transaction(conn):
+        count = reset_expired_streaks(conn)
+    conn.close()
+    click.echo(f"Reset {count} expired streaks.")
+
+
+def ensure_assignment_submissions(conn, assignment_ids: list[int], student_ids: list[int] | None = None):
+    """Create the missing submissions for each assignment's classroom; the caller commits."""
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO assignment_submissions (assignment_id, student_id, status, completed_at, score)
+        SELECT a.id, cs.student_id,
+               CASE WHEN p.id IS NULL THEN 'assigned' ELSE 'completed' END,
+               CASE WHEN p.id IS NULL THEN NULL ELSE ? END,
+               p.score
+        FROM assignments a
+        JOIN classroom_students cs ON cs.classroom_id = a.classroom_id
+        LEFT JOIN progress p
+            ON p.student_id = cs.student_id AND p.lesson_lang = a.lesson_lang AND p.lesson_id = a.lesson_id
+        WHERE a.id IN (SELECT value FROM json_each(?))
+        AND (? IS NULL OR cs.student_id IN (SELECT value FROM json_each(?)))
+        """,
+        (
+            now_ts(),
+            json.dumps(list(assignment_ids)),
+            None if student_ids is None else 1,
+            json.dumps(list(student_ids or [])),
+        ),
+    )
 
-    last_active = row["last_active_date"]
-    streak = row["streak_count"]
 
-    if last_active:
-        last_date = date.fromisoformat(last_active)
-    else:
-        last_date = None
+def reconcile_submissions(conn) -> tuple[int, int]:
+    """Repair submissions that drifted from progress; returns (created, completed)."""
+    before = conn.total_changes
+    ensure_assignment_submissions(conn, [row["id"] for row in conn.execute("SELECT id FROM assignments")])
+    created = conn.total_changes - before
+    cur = conn.execute(
+        """
+        UPDATE assignment_submissions
+        SET status = 'completed', completed_at = ?, score = (
+            SELECT p.score FROM assignments a
+            JOIN progress p ON p.lesson_lang = a.lesson_lang AND p.lesson_id = a.lesson_id
+            WHERE a.id = assignment_submissions.assignment_id AND p.student_id = assignment_submissions.student_id
+        )
+        WHERE status != 'completed'
+        AND EXISTS (
+            SELECT 1 FROM assignments a
+            JOIN progress p ON p.lesson_lang = a.lesson_lang AND p.lesson_id = a.lesson_id
+            WHERE a.id = assignment_submissions.assignment_id AND p.student_id = assignment_submissions.student_id
+        )
+        """,
+        (now_ts(),),
+    )
+    return created, cur.rowcount
 
-    if last_date == today:
-        new_streak = streak
-    elif last_date == (today - timedelta(days=1)):
-        new_streak = streak + 1
-    else:
-        new_streak = 1
 
-    conn.execute(
-        "UPDATE users SET streak_count = ?, last_active_date = ? WHERE id = ?",
-        (new_streak, today.isoformat(), user_id),
-    )
-    conn.commit()
+@app.cli.command("reconcile-submissions")
+def reconcile_submissions_command():
+    """One-off repair of assignment submissions that are missing or behind progress."""
+    conn = get_db()
+    with transaction(conn):
+        created, completed = reconcile_submissions(conn)
     conn.close()
+    click.echo(f"Created {created} missing submissions, marked {completed} completed.")
 
 
-def ensure_assignment_submissions(assignment_id: int, classroom_id: int, lesson_lang: str, lesson_id: int):
-    conn = get_db()
-    students = conn.execute(
-        "SELECT student_id FROM classroom_students WHERE classroom_id = ?",
-        (classroom_id,),
+def join_classroom(conn, classroom_id: int, student_ids: list[int]) -> list[int]:
+    """Add students to a classroom and backfill its assignments; returns the newly added ids."""
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return []
+    joined = conn.execute(
+        """
+        INSERT OR IGNORE INTO classroom_students (classroom_id, student_id, joined_at, xp)
+        SELECT ?, j.value, ?, COALESCE(ss.total_xp, 0)
+        FROM json_each(?) j
+        LEFT JOIN student_stats ss ON ss.student_id = j.value
+        RETURNING student_id, xp
+        """,
+        (classroom_id, now_ts(), json.dumps(student_ids)),
     ).fetchall()
 
-    for student in students:
-        existing_progress = conn.execute(
-            """
-            SELECT score FROM progress
-            WHERE student_id = ? AND lesson_lang = ? AND lesson_id = ?
-            """,
-            (student["student_id"], lesson_lang, lesson_id),
-        ).fetchone()
+    levels: dict[int, int] = {}
+    for row in joined:
+        levels[row["xp"]] = levels.get(row["xp"], 0) + 1
+    conn.executemany(
+        """
+        INSERT INTO classroom_xp_levels (classroom_id, xp, members) VALUES (?, ?, ?)
+        ON CONFLICT(classroom_id, xp) DO UPDATE SET members = members + excluded.members
+        """,
+        [(classroom_id, xp, members) for xp, members in levels.items()],
+    )
+    if joined:
+        conn.execute("UPDATE classrooms SET member_count = member_count + ? WHERE id = ?", (len(joined), classroom_id))
 
-        status = "completed" if existing_progress else "assigned"
-        completed_at = now_ts() if existing_progress else None
-        score = existing_progress["score"] if existing_progress else None
+    assignment_ids = [
+        row["id"] for row in conn.execute("SELECT id FROM assignments WHERE classroom_id = ?", (classroom_id,))
+    ]
+    if assignment_ids:
+        ensure_assignment_submissions(conn, assignment_ids, student_ids)
+    return [row["student_id"] for row in joined]
 
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO assignment_submissions
-            (assignment_id, student_id, status, completed_at, score)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (assignment_id, student["student_id"], status, completed_at, score),
-        )
 
-    conn.commit()
+@app.cli.command("import-roster")
+@click.argument("classroom_code")
+@click.argument("roster", type=click.File("r"))
+def import_roster_command(classroom_code, roster):
+    """Join every student listed in ROSTER (one username or email per line) to a classroom."""
+    names = [line.strip().lower() for line in roster if line.strip() and not line.startswith("#")]
+    conn = get_db()
+    classroom = conn.execute("SELECT id, name FROM classrooms WHERE code = ?", (classroom_code.upper(),)).fetchone()
+    if classroom is None:
+        conn.close()
+        raise click.ClickException(f"No classroom with code {classroom_code}.")
+
+    rows = conn.execute(
+        """
+        SELECT id, username, email FROM users
+        WHERE role = 'Student'
+        AND (username IN (SELECT value FROM json_each(?)) OR email IN (SELECT value FROM json_each(?)))
+        """,
+        (json.dumps(names), json.dumps(names)),
+    ).fetchall()
+    found = {row["username"] for row in rows} | {row["email"] for row in rows}
+    for name in names:
+        if name not in found:
+            click.echo(f"No student account for {name}", err=True)
+
+    with transaction(conn):
+        joined = join_classroom(conn, classroom["id"], [row["id"] for row in rows])
     conn.close()
+    click.echo(f"Joined {len(joined)} students to {classroom['name']} ({len(rows) - len(joined)} already members).")
 
 
 # ---------------- Auth ----------------
@@ -726,9 +2418,11 @@ def admin_login():
 def admin_dashboard():
     if session.get("role") != "Admin":
         return redirect(url_for("admin_login"))
-    data = load_lessons()
-    languages = data["languages"]
-    return render_template("admin_dashboard.html", languages=languages)
+    return render_template(
+        "admin_dashboard.html",
+        languages=all_languages(),
+        hardest_questions=get_hardest_questions(),
+    )
 
 
 @app.route("/admin/lesson/create", methods=["POST"])
@@ -747,9 +2441,7 @@ def admin_create_lesson():
         flash("Please fill out language, title, reading, and quiz.")
         return redirect(url_for("admin_dashboard"))
 
-    data = load_lessons()
-    lang = next((l for l in data["languages"] if l["id"] == lang_id), None)
-    if not lang:
+    if not get_catalog_summary().language(lang_id):
         flash("Language not found.")
         return redirect(url_for("admin_dashboard"))
 
@@ -758,20 +2450,16 @@ def admin_create_lesson():
         flash("Quiz format invalid. Use: Question | A,B,C,D | Answer")
         return redirect(url_for("admin_dashboard"))
 
-    next_id = max([lesson["id"] for lesson in lang["lessons"]] + [0]) + 1
-
-    lang["lessons"].append(
+    add_lesson(
+        lang_id,
         {
-            "id": next_id,
             "title": title,
             "xp": xp,
             "reading": reading,
             "video_url": video_url,
             "quiz": quiz,
-        }
+        },
     )
-
-    save_lessons(data)
     flash("Lesson added.")
     return redirect(url_for("admin_dashboard"))
 
@@ -790,21 +2478,18 @@ def admin_create_language():
         flash("Language id and name are required.")
         return redirect(url_for("admin_dashboard"))
 
-    data = load_lessons()
-    if any(l["id"] == lang_id for l in data["languages"]):
+    try:
+        add_language(
+            {
+                "id": lang_id,
+                "name": name,
+                "description": description or "New language track.",
+                "enabled": enabled,
+            }
+        )
+    except ValueError:
         flash("Language id already exists.")
         return redirect(url_for("admin_dashboard"))
-
-    data["languages"].append(
-        {
-            "id": lang_id,
-            "name": name,
-            "description": description or "New language track.",
-            "enabled": enabled,
-            "lessons": [],
-        }
-    )
-    save_lessons(data)
     flash("Language added.")
     return redirect(url_for("admin_dashboard"))
 
@@ -816,14 +2501,11 @@ def admin_toggle_language():
 
     lang_id = request.form.get("lang_id")
     enabled = bool(request.form.get("enabled"))
-    data = load_lessons()
-    lang = next((l for l in data["languages"] if l["id"] == lang_id), None)
-    if not lang:
+    if not get_catalog_summary().language(lang_id):
         flash("Language not found.")
         return redirect(url_for("admin_dashboard"))
 
-    lang["enabled"] = enabled
-    save_lessons(data)
+    set_language_enabled(lang_id, enabled)
     flash("Language updated.")
     return redirect(url_for("admin_dashboard"))
 
@@ -833,13 +2515,12 @@ def admin_edit_lesson(lang_id, lesson_id):
     if session.get("role") != "Admin":
         return redirect(url_for("admin_login"))
 
-    data = load_lessons()
-    lang = next((l for l in data["languages"] if l["id"] == lang_id), None)
+    lang = get_language(lang_id)
     if not lang:
         flash("Language not found.")
         return redirect(url_for("admin_dashboard"))
 
-    lesson = next((l for l in lang["lessons"] if l["id"] == lesson_id), None)
+    lesson = get_lesson(lang_id, lesson_id)
     if not lesson:
         flash("Lesson not found.")
         return redirect(url_for("admin_dashboard"))
@@ -860,13 +2541,17 @@ def admin_edit_lesson(lang_id, lesson_id):
             flash("Quiz format invalid. Use: Question | A,B,C,D | Answer")
             return redirect(url_for("admin_edit_lesson", lang_id=lang_id, lesson_id=lesson_id))
 
-        lesson["title"] = title
-        lesson["xp"] = xp
-        lesson["reading"] = reading
-        lesson["video_url"] = video_url
-        lesson["quiz"] = quiz
-
-        save_lessons(data)
+        update_lesson(
+            lang_id,
+            lesson_id,
+            {
+                "title": title,
+                "xp": xp,
+                "reading": reading,
+                "video_url": video_url,
+                "quiz": quiz,
+            },
+        )
         flash("Lesson updated.")
         return redirect(url_for("admin_dashboard"))
 
@@ -893,16 +2578,15 @@ def student_home():
     if require_role("Student"):
         return redirect(url_for("teacher_home"))
 
-    languages = all_languages()
     user_id = session["user_id"]
-    total_xp = get_total_xp(user_id)
+    stats = get_student_stats(user_id)
     user = get_user(user_id)
 
     language_cards = []
-    for lang in languages:
-        total_lessons = len(lang["lessons"])
-        completed = get_student_progress(user_id, lang["id"])
-        percent = int((len(completed) / total_lessons) * 100) if total_lessons else 0
+    for lang in all_languages():
+        total_lessons = lang["lesson_count"]
+        completed_count = stats["language_counts"].get(lang["id"], 0)
+        percent = int((completed_count / total_lessons) * 100) if total_lessons else 0
         language_cards.append(
             {
                 "id": lang["id"],
@@ -914,25 +2598,14 @@ def student_home():
             }
         )
 
-    badges = []
-    conn = get_db()
-    completed_total = len(
-        conn.execute("SELECT id FROM progress WHERE student_id = ?", (user_id,)).fetchall()
-    )
-    conn.close()
-    if completed_total >= 1:
-        badges.append("First Lesson")
-    if completed_total >= 3:
-        badges.append("3 Lessons")
-    if completed_total >= 5:
-        badges.append("Python Explorer")
+    badges = get_user_badges(user_id)
 
     notifications = get_unread_notifications(user_id)
     return render_template(
         "student_home.html",
         name=session.get("name"),
         languages=language_cards,
-        total_xp=total_xp,
+        total_xp=stats["total_xp"],
         streak=user["streak_count"],
         badges=badges,
         notifications=notifications,
@@ -947,12 +2620,12 @@ def student_language(lang_id):
     if require_role("Student"):
         return redirect(url_for("teacher_home"))
 
-    lang = get_language(lang_id)
+    lang = get_catalog_summary().language(lang_id)
     if not lang or not lang.get("enabled", False):
         return redirect(url_for("student_home"))
 
     user_id = session["user_id"]
-    completed = get_student_progress(user_id, lang_id)
+    completed = get_completion_bits(user_id, lang_id)
 
     return render_template(
         "student_language.html",
@@ -970,19 +2643,43 @@ def student_certificate(lang_id):
     if require_role("Student"):
         return redirect(url_for("teacher_home"))
 
-    lang = get_language(lang_id)
+    lang = get_catalog_summary().language(lang_id)
     if not lang:
         return redirect(url_for("student_home"))
 
     user_id = session["user_id"]
-    completed = get_student_progress(user_id, lang_id)
-    if len(completed) != len(lang["lessons"]):
+    if not has_completed_language(user_id, lang):
         return redirect(url_for("student_language", lang_id=lang_id))
 
+    certificate = get_certificate(user_id, session.get("name") or "", lang)
     return render_template(
         "student_certificate.html",
         lang=lang,
-        name=session.get("name"),
+        certificate_html=certificate["html"],
+    )
+
+
+@app.route("/student/language/<lang_id>/certificate.pdf")
+def student_certificate_pdf(lang_id):
+    guard = require_login()
+    if guard:
+        return guard
+    if require_role("Student"):
+        return redirect(url_for("teacher_home"))
+
+    lang = get_catalog_summary().language(lang_id)
+    if not lang:
+        return redirect(url_for("student_home"))
+
+    user_id = session["user_id"]
+    if not has_completed_language(user_id, lang):
+        return redirect(url_for("student_language", lang_id=lang_id))
+
+    certificate = get_certificate(user_id, session.get("name") or "", lang)
+    return Response(
+        certificate["pdf"],
+        mimetype="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="codecourse-{lang_id}-certificate.pdf"'},
     )
 
 
@@ -994,14 +2691,13 @@ def student_lesson(lang_id, lesson_id):
     if require_role("Student"):
         return redirect(url_for("teacher_home"))
 
-    lang = get_language(lang_id)
+    lang = get_catalog_summary().language(lang_id)
     if not lang:
         return redirect(url_for("student_home"))
 
     user_id = session["user_id"]
-    completed = get_student_progress(user_id, lang_id)
-    next_unlock = len(completed) + 1
-    if lesson_id > next_unlock and lesson_id not in completed:
+    completed = get_completion_bits(user_id, lang_id)
+    if not completed.is_unlocked(lesson_id):
         return redirect(url_for("student_language", lang_id=lang_id))
 
     lesson = get_lesson(lang_id, lesson_id)
@@ -1054,6 +2750,68 @@ def save_notes(lang_id, lesson_id):
     return redirect(url_for("student_lesson", lang_id=lang_id, lesson_id=lesson_id))
 
 
+QUIZ_PASSING_SCORE = 70
+
+
+def grade_answers(lesson: dict, quiz_key: QuizKey, answers: list) -> dict:
+    marks = quiz_key.grade(answers)
+    results = [
+        {
+            "question": question["question"],
+            "your_answer": answers[idx] if idx < len(answers) else None,
+            "correct_answer": answer,
+            "correct": is_correct,
+        }
+        for idx, (question, answer, is_correct) in enumerate(zip(lesson["quiz"], quiz_key.answers, marks))
+    ]
+    correct_count = sum(marks)
+    total = len(quiz_key)
+    score = int((correct_count / total) * 100) if total else 0
+    return {
+        "score": score,
+        "results": results,
+        "all_correct": correct_count == total,
+        "passed": score >= QUIZ_PASSING_SCORE,
+        "passing_score": QUIZ_PASSING_SCORE,
+    }
+
+
+def grade_batch(lang_id: str, lesson_id: int, submissions: list[list]) -> list[dict] | None:
+    """Score many attempts at one lesson's quiz, or None if the lesson does not exist."""
+    shard = get_language_catalog(lang_id)
+    quiz_key = shard.quiz_keys.get(lesson_id) if shard else None
+    if quiz_key is None:
+        return None
+    total = len(quiz_key)
+    if not total:
+        return [{"score": 0, "passed": False} for _ in submissions]
+    counts = quiz_key.correct_counts(b"".join(quiz_key.encode(answers) for answers in submissions))
+    scores = [int((count / total) * 100) for count in counts]
+    return [{"score": score, "passed": score >= QUIZ_PASSING_SCORE} for score in scores]
+
+
+def submit_quiz(user_id: int, shard, lesson: dict, answers: list) -> dict:
+    """Grade one attempt and record it if it passes; shared by the form and JSON routes."""
+    result = grade_answers(lesson, shard.quiz_keys[lesson["id"]], answers)
+    result["assignment_completed"] = False
+    result["new_badges"] = []
+    if result["passed"]:
+        outcome = record_quiz_pass(user_id, shard.language["id"], lesson["id"], result["score"], lesson.get("xp", 100))
+        result["assignment_completed"] = outcome["assignment_completed"]
+        result["new_badges"] = outcome["new_badges"]
+    # Analytics go last so they can never cost the student a recorded pass.
+    record_quiz_attempt(
+        user_id,
+        shard.language["id"],
+        lesson["id"],
+        answers,
+        [r["correct"] for r in result["results"]],
+        result["score"],
+        result["passed"],
+    )
+    return result
+
+
 @app.route("/student/lesson/<lang_id>/<int:lesson_id>/quiz", methods=["POST"])
 def grade_quiz(lang_id, lesson_id):
     guard = require_login()
@@ -1062,101 +2820,126 @@ def grade_quiz(lang_id, lesson_id):
     if require_role("Student"):
         return redirect(url_for("teacher_home"))
 
-    lesson = get_lesson(lang_id, lesson_id)
+    shard = get_language_catalog(lang_id)
+    lesson = shard.lesson(lesson_id) if shard else None
     if not lesson:
         return redirect(url_for("student_home"))
 
-    quiz = lesson["quiz"]
-    total = len(quiz)
-    correct_count = 0
-    results = []
-
-    for idx, question in enumerate(quiz):
-        user_answer = request.form.get(f"q{idx}")
-        is_correct = user_answer == question["answer"]
-        results.append(
-            {
-                "question": question["question"],
-                "your_answer": user_answer,
-                "correct_answer": question["answer"],
-                "correct": is_correct,
-            }
-        )
-        if is_correct:
-            correct_count += 1
-
-    all_correct = correct_count == total
-    score = int((correct_count / total) * 100)
-
-    user_id = session["user_id"]
-    completed = get_student_progress(user_id, lang_id)
-
-    assignment_completed = False
-    passing_score = 70
-    passed = score >= passing_score
-    assignment_completed = False
-
-    if passed and lesson_id not in completed:
-        conn = get_db()
-        conn.execute(
-            """
-            INSERT INTO progress (student_id, lesson_id, lesson_lang, completed_at, score, xp)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (user_id, lesson_id, lang_id, now_ts(), score, lesson.get("xp", 100)),
-        )
-        conn.commit()
-        conn.close()
-
-        update_streak(user_id)
-        assignment_completed = _complete_assignment_if_any(user_id, lang_id, lesson_id, score)
+    answers = [request.form.get(f"q{idx}") for idx in range(len(lesson["quiz"]))]
+    result = submit_quiz(session["user_id"], shard, lesson, answers)
 
     return render_template(
         "student_lesson.html",
         lesson=lesson,
-        lang=get_language(lang_id),
+        lang=shard.language,
         notes=request.form.get("notes", ""),
-        completed=all_correct,
+        completed=result["all_correct"],
         quiz_result={
-            "score": score,
-            "results": results,
-            "all_correct": passed,
-            "passing_score": passing_score,
-            "assignment_completed": assignment_completed,
+            "score": result["score"],
+            "results": result["results"],
+            "all_correct": result["passed"],
+            "passing_score": result["passing_score"],
+            "assignment_completed": result["assignment_completed"],
+            "new_badges": result["new_badges"],
         },
     )
 
 
-def _complete_assignment_if_any(user_id: int, lang_id: str, lesson_id: int, score: int) -> bool:
-    conn = get_db()
-    submissions = conn.execute(
-        """
-        SELECT s.id FROM assignment_submissions s
-        JOIN assignments a ON a.id = s.assignment_id
-        JOIN classroom_students cs ON cs.classroom_id = a.classroom_id
-        WHERE s.student_id = ?
-        AND a.lesson_id = ?
-        AND a.lesson_lang = ?
-        AND s.status != 'completed'
-        """,
-        (user_id, lesson_id, lang_id),
-    ).fetchall()
+@app.route("/api/student/lesson/<lang_id>/<int:lesson_id>/quiz", methods=["POST"])
+def api_grade_quiz(lang_id, lesson_id):
+    if "user_id" not in session:
+        return jsonify({"error": "Please log in again."}), 401
+    if session.get("role") != "Student":
+        return jsonify({"error": "Only students can take quizzes."}), 403
 
-    updated = False
-    for sub in submissions:
-        conn.execute(
+    shard = get_language_catalog(lang_id)
+    lesson = shard.lesson(lesson_id) if shard else None
+    if not lesson:
+        return jsonify({"error": "Lesson not found."}), 404
+
+    # Accept {"answers": [...]} or {"answers": {"q0": ...}} as JSON, or the quiz form itself.
+    payload = request.get_json(silent=True)
+    count = len(lesson["quiz"])
+    if payload is not None:
+        raw = payload.get("answers") if isinstance(payload, dict) else None
+        if isinstance(raw, list):
+            answers = [a if isinstance(a, str) else None for a in raw[:count]]
+        elif isinstance(raw, dict):
+            answers = [raw.get(f"q{idx}") for idx in range(count)]
+        else:
+            return jsonify({"error": "Expected an answers list."}), 400
+    else:
+        answers = [request.form.get(f"q{idx}") for idx in range(count)]
+
+    result = submit_quiz(session["user_id"], shard, lesson, answers)
+    return jsonify(
+        {
+            "score": result["score"],
+            "passed": result["passed"],
+            "passing_score": result["passing_score"],
+            "results": result["results"],
+            "assignment_completed": result["assignment_completed"],
+            "new_badges": result["new_badges"],
+            "continue_url": url_for("student_language", lang_id=lang_id),
+        }
+    )
+
+
+def record_quiz_pass(user_id: int, lang_id: str, lesson_id: int, score: int, xp: int) -> dict:
+    """Record a passing quiz in one transaction; repeat passes change nothing."""
+    started = time.perf_counter()
+    first_pass = False
+    assignment_completed = False
+    new_badges = []
+
+    conn = get_db()
+    with transaction(conn):
+        cur = conn.execute(
             """
-            UPDATE assignment_submissions
-            SET status = 'completed', completed_at = ?, score = ?
-            WHERE id = ?
+            INSERT OR IGNORE INTO progress (student_id, lesson_id, lesson_lang, completed_at, score, xp)
+            VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (now_ts(), score, sub["id"]),
+            (user_id, lesson_id, lang_id, now_ts(), score, xp),
         )
-        updated = True
-
-    conn.commit()
+        first_pass = cur.rowcount == 1
+        if first_pass:
+            record_progress_stats(conn, user_id, lang_id, xp)
+            completed = record_completion_bit(conn, user_id, lang_id, lesson_id)
+            record_leaderboard_xp(conn, user_id, xp)
+            streak = update_streak(conn, user_id)
+            assignment_completed = _complete_assignment_if_any(conn, user_id, lang_id, lesson_id, score)
+
+            lessons_completed = conn.execute(
+                "SELECT lessons_completed FROM student_stats WHERE student_id = ?", (user_id,)
+            ).fetchone()[0]
+            new_badges += award_badges(conn, user_id, "quiz_passed", lessons_completed=lessons_completed)
+            if streak > 1:
+                new_badges += award_badges(conn, user_id, "streak_extended", streak=streak)
+            lang = get_catalog_summary().language(lang_id)
+            if lang and len(completed) >= lang["lesson_count"]:
+                record_language_completion(conn, user_id, lang_id, lang["lesson_count"])
+                new_badges += award_badges(
+                    conn, user_id, "language_completed", lang_id=lang_id, lesson_count=lang["lesson_count"]
+                )
     conn.close()
-    return updated
+
+    observe_timing("quiz_pass", time.perf_counter() - started)
+    return {"first_pass": first_pass, "assignment_completed": assignment_completed, "new_badges": new_badges}
+
+
+def _complete_assignment_if_any(conn, user_id: int, lang_id: str, lesson_id: int, score: int) -> bool:
+    """Complete the student's open submissions for this lesson; the caller commits."""
+    cur = conn.execute(
+        """
+        UPDATE assignment_submissions
+        SET status = 'completed', completed_at = ?, score = ?
+        WHERE student_id = ?
+        AND status != 'completed'
+        AND assignment_id IN (SELECT id FROM assignments WHERE lesson_lang = ? AND lesson_id = ?)
+        """,
+        (now_ts(), score, user_id, lang_id, lesson_id),
+    )
+    return cur.rowcount > 0
 
 
 @app.route("/student/classroom", methods=["GET", "POST"])
@@ -1180,47 +2963,8 @@ def student_classroom():
             flash("Classroom code not found.")
             return redirect(url_for("student_classroom"))
 
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO classroom_students (classroom_id, student_id, joined_at)
-            VALUES (?, ?, ?)
-            """,
-            (classroom["id"], user_id, now_ts()),
-        )
-        conn.commit()
-
-        # Backfill assignment status for any assignments already completed
-        assignments = conn.execute(
-            """
-            SELECT id, lesson_lang, lesson_id FROM assignments
-            WHERE classroom_id = ?
-            """,
-            (classroom["id"],),
-        ).fetchall()
-
-        for a in assignments:
-            existing_progress = conn.execute(
-                """
-                SELECT score FROM progress
-                WHERE student_id = ? AND lesson_lang = ? AND lesson_id = ?
-                """,
-                (user_id, a["lesson_lang"], a["lesson_id"]),
-            ).fetchone()
-
-            status = "completed" if existing_progress else "assigned"
-            completed_at = now_ts() if existing_progress else None
-            score = existing_progress["score"] if existing_progress else None
-
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO assignment_submissions
-                (assignment_id, student_id, status, completed_at, score)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (a["id"], user_id, status, completed_at, score),
-            )
-
-        conn.commit()
+        with transaction(conn):
+            join_classroom(conn, classroom["id"], [user_id])
         conn.close()
         flash("You joined the classroom!")
         return redirect(url_for("student_classroom"))
@@ -1267,46 +3011,26 @@ def student_classroom():
         for row in comment_rows:
             comments_by_assignment.setdefault(row["assignment_id"], []).append(dict(row))
 
-    # Backfill assignment completion based on progress
-    updated_assignments = []
-    for a in assignments:
-        status = a["status"]
-        if status != "completed":
-            existing_progress = conn.execute(
-                """
-                SELECT score FROM progress
-                WHERE student_id = ? AND lesson_lang = ? AND lesson_id = ?
-                """,
-                (user_id, a["lesson_lang"], a["lesson_id"]),
-            ).fetchone()
-
-            if existing_progress:
-                status = "completed"
-                conn.execute(
-                    """
-                    INSERT INTO assignment_submissions
-                    (assignment_id, student_id, status, completed_at, score)
-                    VALUES (?, ?, 'completed', ?, ?)
-                    ON CONFLICT(assignment_id, student_id)
-                    DO UPDATE SET status = 'completed', completed_at = excluded.completed_at, score = excluded.score
-                    """,
-                    (a["id"], user_id, now_ts(), existing_progress["score"]),
-                )
-
-        updated_assignments.append({**dict(a), "status": status})
-
-    conn.commit()
     conn.close()
 
     classroom_ids = [c["id"] for c in classrooms]
     stream_items = get_stream_posts_for_student(classroom_ids, user_id)
+    leaderboards = [
+        {
+            "classroom": c,
+            "top": get_leaderboard(c["id"], limit=5),
+            "me": get_classroom_rank(c["id"], user_id),
+        }
+        for c in classrooms
+    ]
 
     return render_template(
         "student_classroom.html",
         classrooms=classrooms,
-        assignments=updated_assignments,
+        assignments=assignments,
         stream_items=stream_items,
         comments_by_assignment=comments_by_assignment,
+        leaderboards=leaderboards,
     )
 
 
@@ -1331,46 +3055,8 @@ def join_class_by_code(code):
         flash("Classroom code not found.")
         return redirect(url_for("student_classroom"))
 
-    conn.execute(
-        """
-        INSERT OR IGNORE INTO classroom_students (classroom_id, student_id, joined_at)
-        VALUES (?, ?, ?)
-        """,
-        (classroom["id"], user_id, now_ts()),
-    )
-    conn.commit()
-
-    assignments = conn.execute(
-        """
-        SELECT id, lesson_lang, lesson_id FROM assignments
-        WHERE classroom_id = ?
-        """,
-        (classroom["id"],),
-    ).fetchall()
-
-    for a in assignments:
-        existing_progress = conn.execute(
-            """
-            SELECT score FROM progress
-            WHERE student_id = ? AND lesson_lang = ? AND lesson_id = ?
-            """,
-            (user_id, a["lesson_lang"], a["lesson_id"]),
-        ).fetchone()
-
-        status = "completed" if existing_progress else "assigned"
-        completed_at = now_ts() if existing_progress else None
-        score = existing_progress["score"] if existing_progress else None
-
-        conn.execute(
-            """
-            INSERT OR IGNORE INTO assignment_submissions
-            (assignment_id, student_id, status, completed_at, score)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (a["id"], user_id, status, completed_at, score),
-        )
-
-    conn.commit()
+    with transaction(conn):
+        join_classroom(conn, classroom["id"], [user_id])
     conn.close()
     flash("You joined the classroom!")
     return redirect(url_for("student_classroom"))
@@ -1641,6 +3327,8 @@ def teacher_classroom(classroom_id):
     conn.close()
 
     stream_items = get_stream_posts_for_teacher(classroom_id)
+    difficulty = get_quiz_difficulty((a["lesson_lang"], a["lesson_id"]) for a in assignments)
+    leaderboard = get_leaderboard(classroom_id)
 
     return render_template(
         "teacher_classroom.html",
@@ -1652,7 +3340,8 @@ def teacher_classroom(classroom_id):
         invites=invites,
         comments_by_assignment=comments_by_assignment,
         stream_items=stream_items,
-        languages=all_languages(),
+        difficulty=difficulty,
+        leaderboard=leaderboard,
     )
 
 
@@ -1683,6 +3372,7 @@ def teacher_delete_classroom(classroom_id):
 
     conn.execute("DELETE FROM assignments WHERE classroom_id = ?", (classroom_id,))
     conn.execute("DELETE FROM classroom_students WHERE classroom_id = ?", (classroom_id,))
+    conn.execute("DELETE FROM classroom_xp_levels WHERE classroom_id = ?", (classroom_id,))
     conn.execute("DELETE FROM classroom_invites WHERE classroom_id = ?", (classroom_id,))
     conn.execute("DELETE FROM notifications WHERE classroom_id = ?", (classroom_id,))
     conn.execute("DELETE FROM classrooms WHERE id = ?", (classroom_id,))
@@ -1717,19 +3407,23 @@ def teacher_create_assignment(classroom_id):
         conn.close()
         return redirect(url_for("teacher_home"))
 
-    conn.execute(
-        """
-        INSERT INTO assignments (classroom_id, lesson_id, lesson_lang, due_date, comment, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (classroom_id, lesson_id, lesson_lang, due_date, comment, now_ts()),
-    )
-    conn.commit()
-    assignment_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    with transaction(conn):
+        cur = conn.execute(
+            """
+            INSERT INTO assignments (classroom_id, lesson_id, lesson_lang, due_date, comment, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (classroom_id, lesson_id, lesson_lang, due_date, comment, now_ts()),
+        )
+        ensure_assignment_submissions(conn, [cur.lastrowid])
+        notify_classroom(
+            conn,
+            classroom_id,
+            "New assignment posted",
+            f"{lesson_lang.upper()} Lesson {lesson_id} is ready in {classroom['name']}.",
+        )
     conn.close()
 
-    ensure_assignment_submissions(assignment_id, classroom_id, lesson_lang, lesson_id)
-
     post_lines = [f"{lesson_lang.upper()} Lesson {lesson_id} has been posted."]
     if due_date:
         post_lines.append(f"Due: {due_date}")
@@ -1744,21 +3438,6 @@ def teacher_create_assignment(classroom_id):
         audience="class",
     )
 
-    conn = get_db()
-    students = conn.execute(
-        "SELECT student_id FROM classroom_students WHERE classroom_id = ?",
-        (classroom_id,),
-    ).fetchall()
-    conn.close()
-
-    for student in students:
-        create_notification(
-            student["student_id"],
-            "New assignment posted",
-            f"{lesson_lang.upper()} Lesson {lesson_id} is ready in {classroom['name']}.",
-            classroom_id=classroom_id,
-        )
-
     return redirect(url_for("teacher_classroom", classroom_id=classroom_id))
 
 
@@ -1784,10 +3463,8 @@ def teacher_post_announcement(classroom_id):
         conn.close()
         return redirect(url_for("teacher_home"))
 
-    students = conn.execute(
-        "SELECT student_id FROM classroom_students WHERE classroom_id = ?",
-        (classroom_id,),
-    ).fetchall()
+    with transaction(conn):
+        notify_classroom(conn, classroom_id, "New announcement", f"{classroom['name']}: {message}")
     conn.close()
 
     create_stream_post(
@@ -1799,14 +3476,6 @@ def teacher_post_announcement(classroom_id):
         audience="class",
     )
 
-    for s in students:
-        create_notification(
-            s["student_id"],
-            "New announcement",
-            f"{classroom['name']}: {message}",
-            classroom_id=classroom_id,
-        )
-
     flash("Announcement posted.")
     return redirect(url_for("teacher_classroom", classroom_id=classroom_id))
 
@@ -1926,6 +3595,35 @@ def mark_notifications_read():
     return redirect(request.referrer or url_for("student_home"))
 
 
+# ---------------- Search ----------------
+@app.route("/search")
+def search():
+    guard = require_login()
+    if guard:
+        return guard
+    if session.get("role") not in ("Student", "Teacher"):
+        return redirect(url_for("login"))
+
+    query = request.args.get("q", "").strip()
+    results = search_lessons(query) if query else []
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            [
+                {
+                    "key": f"{r['lang_id']}:{r['lesson_id']}",
+                    "lang_id": r["lang_id"],
+                    "lesson_id": r["lesson_id"],
+                    "lang_name": r["lang_name"],
+                    "title": r["title"],
+                    "snippet": r["snippet"],
+                }
+                for r in results
+            ]
+        )
+    return render_template("search.html", query=query, results=results)
+
+
 # ---------------- Reach Out ----------------
 @app.route("/reach-out", methods=["GET", "POST"])
 def reach_out():
@@ -1985,9 +3683,7 @@ def reach_out():
     return render_template("reach_out.html")
 
 
-DATA_DIR.mkdir(exist_ok=True)
-init_db()
-migrate_db()
+create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,222 @@
+"""Micro-benchmarks for CodeCourse's database paths.
+
+Run from the project root, e.g. ``python bench.py assignment-fanout``. The
+assignment benchmarks work on a throwaway in-memory database; grading reads
+the lesson catalog from codecourse.db but writes nothing.
+"""
+
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import click
+
+from app import (
+    _complete_assignment_if_any,
+    _migration_base_schema,
+    _migration_secondary_indexes,
+    app,
+    ensure_assignment_submissions,
+    generate_code,
+    get_language_catalog,
+    grade_answers,
+    grade_batch,
+    now_ts,
+    transaction,
+)
+
+
+@contextmanager
+def count_statements(conn):
+    """Count the SQL statements ``conn`` runs inside the block (BEGIN/COMMIT included)."""
+    counter = {"statements": 0}
+
+    def trace(sql):
+        counter["statements"] += 1
+
+    conn.set_trace_callback(trace)
+    try:
+        yield counter
+    finally:
+        conn.set_trace_callback(None)
+
+
+def bench_db():
+    """A throwaway in-memory database with the app's core tables and indexes."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    _migration_base_schema(conn.cursor())
+    _migration_secondary_indexes(conn.cursor())
+    conn.commit()
+    return conn
+
+
+def bench_classroom(conn, students: int, lesson_lang: str = "python", lesson_id: int = 1) -> int:
+    """Seed a teacher, a classroom of ``students`` and progress for half of them."""
+    ts = now_ts()
+    code = generate_code(8)
+    teacher_id = conn.execute(
+        """
+        INSERT INTO users (name, username, email, password_hash, role, avatar, created_at)
+        VALUES ('Teacher', ?, ?, '', 'Teacher', '', ?)
+        """,
+        (f"t-{code}", f"t-{code}@bench", ts),
+    ).lastrowid
+    classroom_id = conn.execute(
+        "INSERT INTO classrooms (name, code, teacher_id, created_at) VALUES ('Bench', ?, ?, ?)",
+        (code, teacher_id, ts),
+    ).lastrowid
+    for n in range(students):
+        student_id = conn.execute(
+            """
+            INSERT INTO users (name, username, email, password_hash, role, avatar, created_at)
+            VALUES ('Student', ?, ?, '', 'Student', '', ?)
+            """,
+            (f"s-{code}-{n}", f"s-{code}-{n}@bench", ts),
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO classroom_students (classroom_id, student_id, joined_at) VALUES (?, ?, ?)",
+            (classroom_id, student_id, ts),
+        )
+        if n % 2:
+            conn.execute(
+                """
+                INSERT INTO progress (student_id, lesson_id, lesson_lang, completed_at, score, xp)
+                VALUES (?, ?, ?, ?, 90, 100)
+                """,
+                (student_id, lesson_id, lesson_lang, ts),
+            )
+    conn.commit()
+    return classroom_id
+
+
+def ensure_submissions_per_student(conn, assignment_id, classroom_id, lesson_lang, lesson_id):
+    # The loop ensure_assignment_submissions replaced, kept as the fan-out baseline.
+    students = conn.execute(
+        "SELECT student_id FROM classroom_students WHERE classroom_id = ?",
+        (classroom_id,),
+    ).fetchall()
+    for student in students:
+        existing_progress = conn.execute(
+            "SELECT score FROM progress WHERE student_id = ? AND lesson_lang = ? AND lesson_id = ?",
+            (student["student_id"], lesson_lang, lesson_id),
+        ).fetchone()
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO assignment_submissions
+            (assignment_id, student_id, status, completed_at, score)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                assignment_id,
+                student["student_id"],
+                "completed" if existing_progress else "assigned",
+                now_ts() if existing_progress else None,
+                existing_progress["score"] if existing_progress else None,
+            ),
+        )
+    conn.commit()
+
+
+@click.group()
+def cli():
+    """CodeCourse micro-benchmarks."""
+
+
+@cli.command("assignment-fanout")
+@click.option("--sizes", default="10,100,1000", show_default=True, help="Comma-separated classroom sizes.")
+def assignment_fanout(sizes):
+    """Compare the per-student and set-based assignment fan-out."""
+    conn = bench_db()
+    for size in [int(n) for n in sizes.split(",")]:
+        classroom_id = bench_classroom(conn, size)
+        timings = {}
+        for label in ("per-student", "set-based"):
+            assignment_id = conn.execute(
+                "INSERT INTO assignments (classroom_id, lesson_id, lesson_lang, created_at) VALUES (?, 1, 'python', ?)",
+                (classroom_id, now_ts()),
+            ).lastrowid
+            conn.commit()
+            with count_statements(conn) as counter:
+                started = time.perf_counter()
+                if label == "per-student":
+                    ensure_submissions_per_student(conn, assignment_id, classroom_id, "python", 1)
+                else:
+                    with transaction(conn):
+                        ensure_assignment_submissions(conn, [assignment_id])
+                elapsed = time.perf_counter() - started
+            created = conn.execute(
+                "SELECT COUNT(*) FROM assignment_submissions WHERE assignment_id = ?", (assignment_id,)
+            ).fetchone()[0]
+            timings[label] = (elapsed, counter["statements"], created)
+        click.echo(f"{size} students")
+        for label, (elapsed, statements, created) in timings.items():
+            click.echo(f"  {label:<12} {elapsed * 1000:8.2f} ms  {statements:5d} statements  {created} submissions")
+    conn.close()
+
+
+@cli.command("assignment-completion")
+@click.option("--sizes", default="10,100,1000", show_default=True, help="Comma-separated classroom sizes.")
+def assignment_completion(sizes):
+    """Check a quiz pass completes assignments in a constant number of statements."""
+    conn = bench_db()
+    counts = set()
+    for size in [int(n) for n in sizes.split(",")]:
+        # Lesson 2 is assigned; nobody has passed it yet.
+        classroom_id = bench_classroom(conn, size)
+        with transaction(conn):
+            cur = conn.execute(
+                "INSERT INTO assignments (classroom_id, lesson_id, lesson_lang, created_at) VALUES (?, 2, 'python', ?)",
+                (classroom_id, now_ts()),
+            )
+            ensure_assignment_submissions(conn, [cur.lastrowid])
+        student_id = conn.execute(
+            "SELECT student_id FROM classroom_students WHERE classroom_id = ? LIMIT 1", (classroom_id,)
+        ).fetchone()[0]
+
+        # Counted inside the transaction, as record_quiz_pass runs it.
+        with transaction(conn), count_statements(conn) as counter:
+            started = time.perf_counter()
+            completed = _complete_assignment_if_any(conn, student_id, "python", 2, 90)
+            elapsed = time.perf_counter() - started
+        counts.add(counter["statements"])
+        click.echo(f"{size:6d} students  {elapsed * 1000:7.3f} ms  {counter['statements']} statements  completed={completed}")
+
+    conn.close()
+    if counts != {1}:
+        raise click.ClickException(f"expected exactly 1 statement per quiz pass at every size, saw {sorted(counts)}")
+
+
+@cli.command("grading")
+@click.option("--submissions", default=10000, show_default=True)
+@click.option("--lang", "lang_id", default="python", show_default=True)
+@click.option("--lesson", "lesson_id", default=1, show_default=True)
+def grading(submissions, lang_id, lesson_id):
+    """Compare per-request and batch grading on synthetic submissions."""
+    with app.app_context():
+        shard = get_language_catalog(lang_id)
+        lesson = shard.lesson(lesson_id) if shard else None
+        if lesson is None:
+            raise click.BadParameter(f"no lesson {lang_id}:{lesson_id}")
+        quiz_key = shard.quiz_keys[lesson_id]
+        rng = random.Random(0)
+        attempts = [[rng.choice(q["choices"]) for q in lesson["quiz"]] for _ in range(submissions)]
+
+        started = time.perf_counter()
+        single = [grade_answers(lesson, quiz_key, answers)["score"] for answers in attempts]
+        single_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = [r["score"] for r in grade_batch(lang_id, lesson_id, attempts)]
+        batch_seconds = time.perf_counter() - started
+
+    if single != batch:
+        raise click.ClickException("batch scores differ from per-request scores")
+    click.echo(f"{submissions} submissions, {len(quiz_key)} questions")
+    click.echo(f"  per-request: {single_seconds * 1000:8.1f} ms")
+    click.echo(f"  batch:       {batch_seconds * 1000:8.1f} ms ({single_seconds / batch_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    cli()
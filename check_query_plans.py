@@ -0,0 +1,171 @@
+"""Fail if any SQL the student and teacher routes run needs a full table scan.
+
+Run from the project root with ``python check_query_plans.py``; it exits
+non-zero when a scan is found, so CI can run it as is. The routes are driven
+through Flask's test client against a throwaway database, every statement
+they send to SQLite is recorded, and each distinct one is checked with
+EXPLAIN QUERY PLAN.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["CODECOURSE_DB"] = str(Path(_tmpdir.name) / "codecourse.db")
+
+import app as codecourse  # noqa: E402  (must see CODECOURSE_DB)
+
+PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# Reads that are meant to take the whole table.
+ALLOWED_SCANS = (
+    "SCAN catalog_languages",  # the catalog summary, loaded once per process
+    "SCAN catalog_lessons",
+    "SCAN main.catalog_search_",  # FTS5's own shadow-table reads
+)
+
+
+def call(client, method: str, path: str, **kwargs):
+    resp = client.open(path, method=method, **kwargs)
+    if resp.status_code >= 400:
+        raise SystemExit(f"{method} {path} returned {resp.status_code}; the plan check would miss its queries")
+    return resp
+
+
+def signup(client, username: str, role: str):
+    call(
+        client,
+        "POST",
+        "/",
+        data={
+            "form_type": "signup",
+            "name": username.title(),
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "pw",
+            "role": role,
+            "avatar": "avatar-1.svg",
+        },
+    )
+
+
+def lookup(sql: str):
+    # Fixture lookups go around the traced pool so they are not checked.
+    conn = sqlite3.connect(codecourse.DB_PATH)
+    row = conn.execute(sql).fetchone()
+    conn.close()
+    return row
+
+
+def quiz_answers(lang_id: str, lesson_id: int, correct: bool) -> dict:
+    with codecourse.app.app_context():
+        lesson = codecourse.get_lesson(lang_id, lesson_id)
+    return {f"q{i}": q["answer"] if correct else "" for i, q in enumerate(lesson["quiz"])}
+
+
+def exercise_routes():
+    """Walk a class through joining, assignments, quizzes and grading."""
+    flask_app = codecourse.app
+    teacher = flask_app.test_client()
+    signup(teacher, "teacher", "Teacher")
+    call(teacher, "POST", "/teacher/classroom/create", data={"name": "Plans"})
+    classroom_id, code = lookup("SELECT id, code FROM classrooms")
+    for lesson_key in ("python:1", "python:2"):
+        call(
+            teacher,
+            "POST",
+            f"/teacher/classroom/{classroom_id}/assignments/create",
+            data={"lesson_key": lesson_key, "due_date": "", "comment": "Start here"},
+        )
+    call(teacher, "POST", f"/teacher/classroom/{classroom_id}/announce", data={"message": "Welcome"})
+    call(teacher, "POST", f"/teacher/classroom/{classroom_id}/invite", data={"email": "late@example.com"})
+
+    students = []
+    for n in range(3):
+        student = flask_app.test_client()
+        signup(student, f"student{n}", "Student")
+        if n:
+            call(student, "GET", f"/join/{code}")
+        else:
+            call(student, "POST", "/student/classroom", data={"code": code})
+        students.append(student)
+
+    first = students[0]
+    call(first, "POST", "/api/student/lesson/python/1/quiz", json={"answers": quiz_answers("python", 1, True)})
+    call(first, "POST", "/student/lesson/python/2/quiz", data=quiz_answers("python", 2, True))
+    call(students[1], "POST", "/student/lesson/python/1/quiz", data=quiz_answers("python", 1, False))
+    call(first, "POST", "/student/lesson/python/2/notes", data={"notes": "loops"})
+    codecourse.flush_quiz_attempts()
+
+    (assignment_id,) = lookup("SELECT id FROM assignments")
+    (submission_id,) = lookup("SELECT id FROM assignment_submissions")
+    (student_id,) = lookup("SELECT id FROM users WHERE username = 'student0'")
+    call(first, "POST", f"/student/assignment/{assignment_id}/comment", data={"comment": "Done"})
+    call(
+        teacher,
+        "POST",
+        f"/teacher/assignment/{assignment_id}/comment",
+        data={"message": "Nice", "student_id": student_id},
+    )
+    call(teacher, "POST", f"/teacher/submission/{submission_id}/grade", data={"grade": "95"})
+
+    for path in (
+        "/student/home",
+        "/student/language/python",
+        "/student/lesson/python/1",
+        "/student/lesson/python/3",
+        "/student/classroom",
+        "/search?q=loop",
+        "/search?q=print&format=json",
+    ):
+        call(first, "GET", path)
+    call(first, "POST", "/notifications/read")
+    call(teacher, "GET", "/teacher/home")
+    call(teacher, "GET", f"/teacher/classroom/{classroom_id}")
+    call(teacher, "POST", f"/teacher/classroom/{classroom_id}/delete")
+
+
+def find_table_scans(statements) -> list[tuple[str, str]]:
+    """Return (statement, plan detail) for every statement that scans a real table."""
+    conn = sqlite3.connect(codecourse.DB_PATH)
+    scans = []
+    for sql in statements:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            detail = row[3]
+            if not detail.startswith("SCAN ") or detail.startswith(ALLOWED_SCANS):
+                continue
+            # Table-valued functions (json_each) and FTS5 show up as virtual-table scans.
+            if "VIRTUAL TABLE" in detail or detail == "SCAN CONSTANT ROW":
+                continue
+            scans.append((" ".join(sql.split()), detail))
+    conn.close()
+    return scans
+
+
+def main() -> int:
+    statements: dict[str, None] = {}
+
+    def record(sql):
+        if sql.lstrip().upper().startswith(PLANNED):
+            statements.setdefault(sql, None)
+
+    codecourse._pool.close_all()
+    codecourse._pool.trace = record
+    exercise_routes()
+    codecourse._pool.trace = None
+    codecourse._pool.close_all()
+
+    scans = find_table_scans(statements)
+    for sql, detail in scans:
+        print(f"{detail}\n    {sql}", file=sys.stderr)
+    if scans:
+        return 1
+    print(f"{len(statements)} route statements use indexes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
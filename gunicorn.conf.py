@@ -0,0 +1,44 @@
+"""Gunicorn settings for CodeCourse.
+
+Run with ``gunicorn app:app`` from the project root; gunicorn picks this
+file up automatically. The app is preloaded so the catalog, compiled
+templates and static versions are built once in the master and shared
+copy-on-write by every worker.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any fork.
+    if not server.cfg.preload_app:
+        return
+    from app import warmup
+
+    warmup()
+    # Move everything built so far out of the collector's view so workers
+    # don't dirty those pages (and lose the sharing) on their first GC pass.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Without --preload each worker warms its own caches before serving. Shards
+    # are not shared between workers here, so each loads only the languages
+    # its requests ask for.
+    if worker.cfg.preload_app:
+        return
+    from app import warmup
+
+    warmup(shards=False)
+
+
+def worker_exit(server, worker):
+    # Write out quiz attempts still sitting in this worker's buffer.
+    from app import flush_quiz_attempts
+
+    flush_quiz_attempts()